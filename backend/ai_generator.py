@@ -1,6 +1,45 @@
-from typing import List, Optional
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
 
 import anthropic
+import httpx
+import numpy as np
+
+# Clients shared by every AIGenerator with the same API key, so connection
+# pools and TLS sessions survive generator re-creation. Each keeps the SDK's
+# default pool limits, timeout and retries.
+_CLIENT_CACHE: Dict[str, anthropic.Anthropic] = {}
+
+
+def _get_client(api_key: str) -> anthropic.Anthropic:
+    """Return the shared Anthropic client for an API key, creating it once"""
+    client = _CLIENT_CACHE.get(api_key)
+    if client is None:
+        client = anthropic.Anthropic(api_key=api_key)
+        _CLIENT_CACHE[api_key] = client
+    return client
+
+
+def _unit_vector(embedding) -> Optional[np.ndarray]:
+    """Return an embedding scaled to unit length, or None for a zero vector"""
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return None
+    return vector / norm
+
+
+class _RawObject(dict):
+    """Decoded API JSON object that also allows SDK-style attribute access"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
 
 
 class AIGenerator:
@@ -37,19 +76,104 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
 
-    def __init__(self, api_key: str, model: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    # System prompt as a cacheable block, built once at class load and shared by
+    # every instance and call so the request prefix is byte-for-byte stable
+    _CACHED_SYSTEM_BLOCK = [
+        {
+            "type": "text",
+            "text": SYSTEM_PROMPT,
+            "cache_control": {"type": "ephemeral"},
+        }
+    ]
+
+    # Shared shape of every tool_result block; copied, never mutated
+    _TOOL_RESULT_TEMPLATE = {"type": "tool_result"}
+
+    # Maximum sequential tool-calling rounds per query
+    MAX_TOOL_ROUNDS = 2
+
+    # Seconds between Message Batches status checks
+    BATCH_POLL_INTERVAL = 5
+
+    # Messages endpoint settings for the raw_http fast path
+    RAW_API_BASE_URL = "https://api.anthropic.com"
+    RAW_API_VERSION = "2023-06-01"
+
+    # raw_http retries, mirroring the SDK: attempts after the first, and the
+    # exponential backoff bounds in seconds
+    RAW_MAX_RETRIES = anthropic.DEFAULT_MAX_RETRIES
+    RAW_RETRY_INITIAL_DELAY = 0.5
+    RAW_RETRY_MAX_DELAY = 8.0
+
+    # Cosine distance under which a semantically cached answer is reused
+    SEMANTIC_CACHE_MAX_DISTANCE = 0.05
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        response_cache_size: int = 0,
+        embedding_function: Optional[Callable] = None,
+        parallel_tools: bool = False,
+        raw_http: bool = False,
+    ):
+        self.client = _get_client(api_key)
         self.model = model
 
+        # Optional fast path posting straight to the Messages endpoint, skipping
+        # the SDK's per-request model validation; the SDK stays the default.
+        # It keeps the SDK's pool limits and timeout, and _raw_create retries
+        # 408/409/429/5xx and connection errors as the SDK would.
+        self._http = (
+            httpx.Client(
+                base_url=self.RAW_API_BASE_URL,
+                headers={
+                    "x-api-key": api_key,
+                    "anthropic-version": self.RAW_API_VERSION,
+                    "content-type": "application/json",
+                },
+                limits=anthropic.DEFAULT_CONNECTION_LIMITS,
+                timeout=anthropic.DEFAULT_TIMEOUT,
+            )
+            if raw_http
+            else None
+        )
+
         # Pre-build base API parameters
         self.base_params = {"model": self.model, "temperature": 0, "max_tokens": 800}
 
+        # One tool call per turn keeps the two-round budget predictable; with
+        # parallel_tools, multiple tool_use blocks run concurrently instead
+        self._tool_choice = (
+            {"type": "auto"}
+            if parallel_tools
+            else {"type": "auto", "disable_parallel_tool_use": True}
+        )
+
+        # Last tools list seen and its cache-annotated copy
+        self._tools_source = None
+        self._tools_cached = None
+
+        # Opt-in cache of answers that needed no tool execution, keyed by
+        # query/history/tools. Optional semantic lookup embeds queries to match
+        # near-duplicates.
+        self._response_cache_size = response_cache_size
+        self._response_cache: OrderedDict = OrderedDict()
+        self._embedding_function = embedding_function
+
+        # Semantic entries as a ring buffer: unit query embeddings are the rows
+        # of one matrix, allocated on first store, so a lookup is one dot product
+        self._semantic_matrix: Optional[np.ndarray] = None
+        self._semantic_entries: List[tuple] = []
+        self._semantic_next = 0
+
     def generate_response(
         self,
         query: str,
-        conversation_history: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None,
         tools: Optional[List] = None,
         tool_manager=None,
+        cache_query: Optional[str] = None,
     ) -> str:
         """
         Generate AI response with optional tool usage and conversation context.
@@ -57,105 +181,584 @@ Provide only the direct answer to what was asked.
 
         Args:
             query: The user's question or request
-            conversation_history: Previous messages for context
+            conversation_history: Previous {"role", "content"} messages for context
             tools: Available tools the AI can use
             tool_manager: Manager to execute tools
+            cache_query: Text the response cache keys and embeds instead of
+                query, such as the bare question inside a templated prompt
 
         Returns:
             Generated response as string
         """
-        MAX_TOOL_ROUNDS = 2
+        # Serve repeated questions from the response cache when it is safe to
+        cache_key, query_embedding, cached = self._lookup_cached_response(
+            cache_query or query, conversation_history, tools
+        )
+        if cached is not None:
+            return cached
+
+        # Without tools there is exactly one call, so skip the tool loop entirely
+        if not tools:
+            text = self._simple_call(query, conversation_history)
+            if cache_key is not None:
+                self._store_cached_response(cache_key, query_embedding, text)
+            return text
+
+        # Initialize message list with prior turns and the user query
+        messages = self._build_messages(query, conversation_history)
+        api_params = self._build_api_params(messages, tools)
+
+        response, round_count = self._run_tool_rounds(
+            api_params, messages, tool_manager
+        )
+        if response is not None:
+            text = self._extract_text_response(response)
+            # Only tool-free answers are cached: tool runs also produce sources
+            if (
+                cache_key is not None
+                and round_count == 0
+                and response.stop_reason != "tool_use"
+            ):
+                self._store_cached_response(cache_key, query_embedding, text)
+            return text
+
+        # Force final response after max rounds (without tools). Only reached when
+        # the last round still requested tools; text answers returned above.
+        api_params.pop("tools", None)
+        api_params.pop("tool_choice", None)
+        final_response = self._create_message(api_params)
+        return self._extract_text_response(final_response)
+
+    def generate_response_stream(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict]] = None,
+        tools: Optional[List] = None,
+        tool_manager=None,
+        cache_query: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Stream an AI response as text chunks.
+        Calls that cannot use tools stream live. A tool-enabled round holds its
+        text back until it ends without tool_use, so, as in generate_response,
+        only the answering round's text reaches the caller.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous {"role", "content"} messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            cache_query: Text the response cache keys and embeds instead of query
+
+        Yields:
+            Text chunks of the generated response
+        """
+        cache_key, query_embedding, cached = self._lookup_cached_response(
+            cache_query or query, conversation_history, tools
+        )
+        if cached is not None:
+            yield cached
+            return
+
+        messages = self._build_messages(query, conversation_history)
+        api_params = self._build_api_params(messages, tools)
+
+        round_count = 0
+        while True:
+            live = "tools" not in api_params
+            chunks = []
+            with self.client.messages.stream(**api_params) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    if live:
+                        yield text
+                # tool_use input is only complete once the whole message arrived
+                response = stream.get_final_message()
+
+            if response.stop_reason != "tool_use" or not tool_manager or live:
+                break
+
+            # Text written before a tool call is dropped, never shown
+
+            self._append_tool_round(response, messages, tool_manager)
+            round_count += 1
+
+            # Force the final round to answer (without tools)
+            if round_count >= self.MAX_TOOL_ROUNDS:
+                api_params.pop("tools", None)
+                api_params.pop("tool_choice", None)
+
+        # Release the held-back text of a tool-enabled round that answered
+        if not live:
+            yield from chunks
+
+        if (
+            cache_key is not None
+            and round_count == 0
+            and response.stop_reason != "tool_use"
+        ):
+            self._store_cached_response(cache_key, query_embedding, "".join(chunks))
+
+    def generate_responses_batch(
+        self,
+        queries: List[str],
+        tools: Optional[List] = None,
+        tool_manager=None,
+    ) -> List[str]:
+        """
+        Generate responses for many independent queries via the Message Batches API.
+        Batched requests are billed at a discount but complete asynchronously, so
+        this suits offline workloads such as evaluation runs.
+
+        Args:
+            queries: Independent questions to answer
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
 
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else self.SYSTEM_PROMPT
+        Returns:
+            Generated responses in the same order as queries
+        """
+        if not queries:
+            return []
+
+        batch = self.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": f"query-{index}",
+                    "params": self._build_api_params(
+                        [{"role": "user", "content": query}], tools
+                    ),
+                }
+                for index, query in enumerate(queries)
+            ]
         )
 
-        # Initialize message list with user query
-        messages = [{"role": "user", "content": query}]
+        while batch.processing_status != "ended":
+            time.sleep(self.BATCH_POLL_INTERVAL)
+            batch = self.client.messages.batches.retrieve(batch.id)
+
+        responses: List[Optional[str]] = [None] * len(queries)
+        for entry in self.client.messages.batches.results(batch.id):
+            index = int(entry.custom_id.removeprefix("query-"))
+            result = entry.result
+            # Tool use needs follow-up calls, so those queries are left for the
+            # single-request path along with any errored or expired requests
+            if result.type == "succeeded" and not (
+                tool_manager and result.message.stop_reason == "tool_use"
+            ):
+                responses[index] = self._extract_text_response(result.message)
+
+        return [
+            (
+                response
+                if response is not None
+                else self.generate_response(
+                    query, tools=tools, tool_manager=tool_manager
+                )
+            )
+            for query, response in zip(queries, responses)
+        ]
 
-        # Prepare base API parameters
-        api_params = {**self.base_params, "system": system_content}
+    def _simple_call(
+        self, query: str, conversation_history: Optional[List[Dict]]
+    ) -> str:
+        """
+        Answer with a single API call and no tools.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous {"role", "content"} messages for context
+
+        Returns:
+            Generated response as string
+        """
+        response = self._create_message(
+            self._build_api_params(
+                self._build_messages(query, conversation_history), None
+            )
+        )
+        return self._extract_text_response(response)
+
+    def _build_messages(
+        self, query: str, conversation_history: Optional[List[Dict]]
+    ) -> List:
+        """
+        Build the message list from prior turns followed by the new user query.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous {"role", "content"} messages for context
+
+        Returns:
+            Messages for the API, with the history prefix marked as cacheable
+        """
+        # The API rejects empty text content, so blank turns (such as an empty
+        # answer) are left out rather than sent
+        history = [
+            message
+            for message in conversation_history or ()
+            if message["content"].strip()
+        ]
+        if not history:
+            return [{"role": "user", "content": query}]
+
+        # The history is identical from one turn to the next, so caching up to
+        # its last message lets the following turn reuse the whole prefix
+        *earlier, last = history
+        return [
+            *earlier,
+            {
+                "role": last["role"],
+                "content": [
+                    {
+                        "type": "text",
+                        "text": last["content"],
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            },
+            {"role": "user", "content": query},
+        ]
+
+    def _build_api_params(self, messages: List, tools: Optional[List]) -> dict:
+        """
+        Build the request parameters shared by every call for one query.
+
+        Args:
+            messages: Message list, shared by reference with the tool loop
+            tools: Available tools the AI can use
+
+        Returns:
+            Keyword arguments for client.messages.create
+        """
+        # Prepare API parameters once; messages is shared by reference so appends
+        # made in the loop are visible without reassignment
+        api_params = {
+            **self.base_params,
+            "system": self._CACHED_SYSTEM_BLOCK,
+            "messages": messages,
+        }
 
         # Add tools if available (kept for all iterations within the loop)
         if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
+            api_params["tools"] = self._get_cached_tools(tools)
+            api_params["tool_choice"] = self._tool_choice
+
+        return api_params
+
+    def _run_tool_rounds(self, api_params: dict, messages: List, tool_manager) -> tuple:
+        """
+        Call Claude and execute requested tools for up to MAX_TOOL_ROUNDS.
+
+        Args:
+            api_params: Request parameters from _build_api_params
+            messages: Message list referenced by api_params
+            tool_manager: Manager to execute tools
 
+        Returns:
+            Tuple of (final response or None if rounds ran out, rounds executed)
+        """
         # Iterative tool loop
         round_count = 0
-        while round_count < MAX_TOOL_ROUNDS:
-            # Update messages in params
-            api_params["messages"] = messages
-
+        while round_count < self.MAX_TOOL_ROUNDS:
             # Call Claude API
-            response = self.client.messages.create(**api_params)
+            response = self._create_message(api_params)
 
             # Exit if no tool use requested
             if response.stop_reason != "tool_use":
-                return self._extract_text_response(response)
+                return response, round_count
 
             # Exit if no tool_manager to execute tools
             if not tool_manager:
-                return self._extract_text_response(response)
+                return response, round_count
 
-            # Execute tools and collect results
-            tool_results, _ = self._execute_tool_calls(response, tool_manager)
+            self._append_tool_round(response, messages, tool_manager)
+            round_count += 1
 
-            # Append assistant's tool use response to messages
-            messages.append({"role": "assistant", "content": response.content})
+        return None, round_count
 
-            # Append tool results to messages
-            if tool_results:
-                messages.append({"role": "user", "content": tool_results})
+    def _append_tool_round(self, response, messages: List, tool_manager) -> None:
+        """
+        Execute the tools a response requested and append the round to messages.
 
-            round_count += 1
+        Args:
+            response: Claude API response that stopped for tool_use
+            messages: Message list referenced by the request parameters
+            tool_manager: Manager to execute tools
+        """
+        # Execute tools and collect results
+        tool_results, _ = self._execute_tool_calls(
+            self._tool_use_blocks(response), tool_manager
+        )
 
-        # Force final response after max rounds (without tools)
-        final_params = {
-            **self.base_params,
-            "messages": messages,
-            "system": system_content,
-        }
-        final_response = self.client.messages.create(**final_params)
-        return self._extract_text_response(final_response)
+        # Append the assistant's tool use turn and its tool results together;
+        # the API rejects a tool_use turn without a following tool_result, and
+        # response.content is passed by reference rather than copied
+        messages.extend(
+            (
+                {"role": "assistant", "content": response.content},
+                {"role": "user", "content": tool_results},
+            )
+        )
 
-    def _execute_tool_calls(self, response, tool_manager) -> tuple:
+    def _lookup_cached_response(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict]],
+        tools: Optional[List],
+    ) -> tuple:
+        """
+        Look up a cached answer for this query.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous {"role", "content"} messages for context
+            tools: Available tools the AI can use
+
+        Returns:
+            Tuple of (cache key or None, query embedding or None, cached answer
+            or None)
+        """
+        cache_key = self._response_cache_key(query, conversation_history, tools)
+        if cache_key is None:
+            return None, None, None
+
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self._response_cache.move_to_end(cache_key)
+            return cache_key, None, cached
+
+        query_embedding = None
+        if self._embedding_function:
+            query_embedding = _unit_vector(self._embedding_function([query])[0])
+            if query_embedding is not None:
+                cached = self._semantic_lookup(cache_key, query_embedding)
+        return cache_key, query_embedding, cached
+
+    def _response_cache_key(
+        self,
+        query: str,
+        conversation_history: Optional[List[Dict]],
+        tools: Optional[List],
+    ) -> Optional[tuple]:
         """
-        Execute all tool calls from a response.
+        Build the response cache key, or None when caching is not safe.
 
         Args:
-            response: Claude API response containing tool_use blocks
+            query: The user's question or request
+            conversation_history: Previous {"role", "content"} messages for context
+            tools: Available tools the AI can use
+
+        Returns:
+            Tuple of (normalized query, history turns, tool names) or None
+        """
+        if not self._response_cache_size:
+            return None
+
+        normalized_query = " ".join(query.casefold().split())
+        tools_fingerprint = tuple(tool.get("name") for tool in tools or ())
+        # The turns themselves, not their hash, so colliding histories never
+        # share an answer
+        history_fingerprint = tuple(
+            (message["role"], message["content"])
+            for message in conversation_history or ()
+        )
+        return normalized_query, history_fingerprint, tools_fingerprint
+
+    def _semantic_lookup(
+        self, cache_key: tuple, query_embedding: np.ndarray
+    ) -> Optional[str]:
+        """Find a cached answer for a near-identical query in the same context"""
+        if not self._semantic_entries:
+            return None
+
+        # Rows are unit vectors, so the dot products are cosine similarities
+        similarities = (
+            self._semantic_matrix[: len(self._semantic_entries)] @ query_embedding
+        )
+        candidates = np.flatnonzero(
+            similarities > 1.0 - self.SEMANTIC_CACHE_MAX_DISTANCE
+        )
+        # Closest first, among entries cached under the same history and tools
+        for index in candidates[np.argsort(-similarities[candidates])]:
+            context, response = self._semantic_entries[index]
+            if context == cache_key[1:]:
+                return response
+        return None
+
+    def _store_cached_response(
+        self, cache_key: tuple, query_embedding, response: str
+    ) -> None:
+        """Store an answer in the exact-match LRU and the semantic ring buffer"""
+        self._response_cache[cache_key] = response
+        self._response_cache.move_to_end(cache_key)
+        if len(self._response_cache) > self._response_cache_size:
+            self._response_cache.popitem(last=False)
+
+        if query_embedding is not None:
+            self._store_semantic_entry(cache_key[1:], query_embedding, response)
+
+    def _store_semantic_entry(
+        self, context: tuple, query_embedding: np.ndarray, response: str
+    ) -> None:
+        """Write an entry into the semantic ring buffer, replacing the oldest"""
+        if self._semantic_matrix is None:
+            self._semantic_matrix = np.empty(
+                (self._response_cache_size, query_embedding.size), dtype=np.float32
+            )
+
+        index = self._semantic_next
+        self._semantic_matrix[index] = query_embedding
+        if index < len(self._semantic_entries):
+            self._semantic_entries[index] = (context, response)
+        else:
+            self._semantic_entries.append((context, response))
+        self._semantic_next = (index + 1) % self._response_cache_size
+
+    def _get_cached_tools(self, tools: List) -> List:
+        """
+        Return a copy of tools with cache_control on the last definition.
+
+        The annotated copy is reused while callers keep passing the same (or an
+        equal) tools list, and the caller's list is never mutated.
+
+        Args:
+            tools: Tool definitions to send to the API
+
+        Returns:
+            Tool definitions with the schema prefix marked as cacheable
+        """
+        if tools is not self._tools_source and tools != self._tools_source:
+            tools_cached = list(tools)
+            tools_cached[-1] = {**tools[-1], "cache_control": {"type": "ephemeral"}}
+            self._tools_source = tools
+            self._tools_cached = tools_cached
+        return self._tools_cached
+
+    def _create_message(self, api_params: dict):
+        """
+        Call the Messages API through the SDK or, with raw_http, directly.
+
+        Args:
+            api_params: Request parameters from _build_api_params
+
+        Returns:
+            Response exposing stop_reason and content blocks as attributes
+        """
+        if self._http is None:
+            return self.client.messages.create(**api_params)
+        return self._raw_create(api_params)
+
+    def _raw_create(self, api_params: dict) -> _RawObject:
+        """
+        POST a Messages request without SDK validation.
+
+        Args:
+            api_params: Request parameters; content blocks from earlier raw
+                responses are plain dicts and serialize as-is
+
+        Returns:
+            Decoded response with attribute access on every JSON object
+
+        Raises:
+            httpx.HTTPStatusError: Error status, once retries are used up
+            httpx.TransportError: Connection failure, once retries are used up
+        """
+        content = json.dumps(api_params, separators=(",", ":")).encode("utf-8")
+        for attempt in range(self.RAW_MAX_RETRIES + 1):
+            last_attempt = attempt == self.RAW_MAX_RETRIES
+            retry_after = None
+            try:
+                response = self._http.post("/v1/messages", content=content)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                status = response.status_code
+                retryable = status in (408, 409, 429) or status >= 500
+                if last_attempt or not retryable:
+                    response.raise_for_status()
+                    return json.loads(response.content, object_hook=_RawObject)
+                retry_after = response.headers.get("retry-after")
+            time.sleep(self._raw_retry_delay(attempt, retry_after))
+
+    def _raw_retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Seconds to wait before retrying: a short Retry-After, else backoff"""
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = 0.0
+        if 0 < delay <= 60:
+            return delay
+        return min(self.RAW_RETRY_INITIAL_DELAY * 2**attempt, self.RAW_RETRY_MAX_DELAY)
+
+    def _tool_use_blocks(self, response) -> List:
+        """
+        Collect the tool_use blocks of a response in order.
+
+        Args:
+            response: Claude API response
+
+        Returns:
+            List of tool_use content blocks
+        """
+        return [block for block in response.content if block.type == "tool_use"]
+
+    def _execute_tool_calls(self, tool_uses: List, tool_manager) -> tuple:
+        """
+        Execute tool_use blocks from a response.
+        Multiple tool_use blocks run concurrently since tools are IO-bound.
+
+        Args:
+            tool_uses: tool_use blocks from _tool_use_blocks
             tool_manager: Manager to execute tools
 
         Returns:
             Tuple of (tool_results list, has_error boolean)
         """
-        tool_results = []
-        has_error = False
-
-        for content_block in response.content:
-            if content_block.type == "tool_use":
-                try:
-                    tool_result = tool_manager.execute_tool(
-                        content_block.name, **content_block.input
+        if len(tool_uses) > 1:
+            with ThreadPoolExecutor(max_workers=len(tool_uses)) as executor:
+                outcomes = list(
+                    executor.map(
+                        lambda block: self._run_tool(block, tool_manager), tool_uses
                     )
-                except Exception as e:
-                    tool_result = f"Tool execution error: {str(e)}"
-                    has_error = True
-
-                tool_results.append(
-                    {
-                        "type": "tool_result",
-                        "tool_use_id": content_block.id,
-                        "content": tool_result,
-                    }
                 )
+        else:
+            outcomes = [self._run_tool(block, tool_manager) for block in tool_uses]
+
+        # Results stay in tool_use order so each tool_use_id lines up
+        tool_results = [None] * len(tool_uses)
+        has_error = False
+        for index, (content_block, (tool_result, failed)) in enumerate(
+            zip(tool_uses, outcomes)
+        ):
+            result = self._TOOL_RESULT_TEMPLATE.copy()
+            result["tool_use_id"] = content_block.id
+            result["content"] = tool_result
+            tool_results[index] = result
+            has_error = has_error or failed
 
         return tool_results, has_error
 
+    def _run_tool(self, content_block, tool_manager) -> tuple:
+        """
+        Execute a single tool_use block, converting exceptions to error text.
+
+        Args:
+            content_block: tool_use block from a Claude response
+            tool_manager: Manager to execute tools
+
+        Returns:
+            Tuple of (tool result string, failed boolean)
+        """
+        try:
+            return (
+                tool_manager.execute_tool(content_block.name, **content_block.input),
+                False,
+            )
+        except Exception as e:
+            return f"Tool execution error: {str(e)}", True
+
     def _extract_text_response(self, response) -> str:
         """
         Extract text content from Claude response.
@@ -166,7 +769,14 @@ Provide only the direct answer to what was asked.
         Returns:
             Text content from response, or empty string if no text found
         """
-        for block in response.content:
-            if hasattr(block, "text"):
-                return block.text
+        content = response.content
+        if content:
+            # Fast path: responses almost always lead with their text block
+            text = getattr(content[0], "text", None)
+            if text is not None:
+                return text
+            for block in content[1:]:
+                text = getattr(block, "text", None)
+                if text is not None:
+                    return text
         return ""
@@ -24,6 +24,10 @@ class Config:
     MAX_RESULTS: int = 5  # Maximum search results to return
     MAX_HISTORY: int = 2  # Number of conversation messages to remember
 
+    # Response cache settings (off by default)
+    RESPONSE_CACHE_SIZE: int = 0  # Tool-free answers kept for repeat questions
+    SEMANTIC_CACHE: bool = False  # Also reuse answers for near-duplicate questions
+
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
 
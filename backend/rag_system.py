@@ -1,5 +1,5 @@
 import os
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from ai_generator import AIGenerator
 from document_processor import DocumentProcessor
@@ -23,7 +23,12 @@ class RAGSystem:
             config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS
         )
         self.ai_generator = AIGenerator(
-            config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL
+            config.ANTHROPIC_API_KEY,
+            config.ANTHROPIC_MODEL,
+            response_cache_size=config.RESPONSE_CACHE_SIZE,
+            embedding_function=(
+                self.vector_store.embedding_function if config.SEMANTIC_CACHE else None
+            ),
         )
         self.session_manager = SessionManager(config.MAX_HISTORY)
 
@@ -132,6 +137,56 @@ class RAGSystem:
         Returns:
             Tuple of (response, sources list - empty for tool-based approach)
         """
+        # Generate response using AI with tools
+        response = self.ai_generator.generate_response(
+            **self._generation_kwargs(query, session_id)
+        )
+
+        # Return response with sources from tool searches
+        return response, self._finish_query(query, session_id, response)
+
+    def query_stream(
+        self, query: str, session_id: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """
+        Process a user query, streaming the response as it is generated.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+
+        Yields:
+            {"type": "text", "text": ...} events for each response chunk, then a
+            single {"type": "sources", "sources": [...]} event
+        """
+        chunks = []
+        try:
+            for chunk in self.ai_generator.generate_response_stream(
+                **self._generation_kwargs(query, session_id)
+            ):
+                chunks.append(chunk)
+                yield {"type": "text", "text": chunk}
+
+            # Only a completed stream is recorded as an exchange
+            sources = self._finish_query(query, session_id, "".join(chunks))
+        finally:
+            # A client disconnect or a failed stream skips _finish_query; the
+            # shared ToolManager must not carry these sources into the next query
+            self.tool_manager.reset_sources()
+
+        yield {"type": "sources", "sources": sources}
+
+    def _generation_kwargs(self, query: str, session_id: Optional[str]) -> Dict:
+        """
+        Build the AIGenerator arguments shared by query and query_stream.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+
+        Returns:
+            Keyword arguments for generate_response or generate_response_stream
+        """
         # Create prompt for the AI with clear instructions
         prompt = f"""Answer this question about course materials: {query}"""
 
@@ -140,14 +195,30 @@ class RAGSystem:
         if session_id:
             history = self.session_manager.get_conversation_history(session_id)
 
-        # Generate response using AI with tools
-        response = self.ai_generator.generate_response(
-            query=prompt,
-            conversation_history=history,
-            tools=self.tool_manager.get_tool_definitions(),
-            tool_manager=self.tool_manager,
-        )
+        return {
+            "query": prompt,
+            "conversation_history": history,
+            "tools": self.tool_manager.get_tool_definitions(),
+            "tool_manager": self.tool_manager,
+            # Cache on the bare question: the shared prompt template would pull
+            # every embedding together
+            "cache_query": query,
+        }
+
+    def _finish_query(
+        self, query: str, session_id: Optional[str], response: str
+    ) -> List[str]:
+        """
+        Collect the sources of a finished query and record the exchange.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+            response: Complete generated response
 
+        Returns:
+            Sources from the tool searches made while answering
+        """
         # Get sources from the search tool
         sources = self.tool_manager.get_last_sources()
 
@@ -158,8 +229,7 @@ class RAGSystem:
         if session_id:
             self.session_manager.add_exchange(session_id, query, response)
 
-        # Return response with sources from tool searches
-        return response, sources
+        return sources
 
     def get_course_analytics(self) -> Dict:
         """Get analytics about the course catalog"""
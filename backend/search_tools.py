@@ -1,3 +1,4 @@
+import time
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional
 
@@ -127,9 +128,15 @@ class CourseSearchTool(Tool):
 class CourseOutlineTool(Tool):
     """Tool for retrieving course outline (title, link, and lesson list)"""
 
+    # Outlines are static once indexed, so repeat lookups are served from memory
+    OUTLINE_CACHE_TTL = 300  # Seconds a cached outline stays valid
+    OUTLINE_CACHE_SIZE = 64  # Maximum cached outlines
+
     def __init__(self, vector_store: VectorStore):
         self.store = vector_store
         self.last_sources = []
+        # course_title -> (expires_at, outline, sources)
+        self._outline_cache: Dict[str, tuple] = {}
 
     def get_tool_definition(self) -> Dict[str, Any]:
         return {
@@ -148,6 +155,13 @@ class CourseOutlineTool(Tool):
         }
 
     def execute(self, course_title: str) -> str:
+        # Serve a recent outline (and its sources) without touching the store
+        cached = self._outline_cache.get(course_title)
+        if cached and cached[0] > time.monotonic():
+            _, outline, sources = cached
+            self.last_sources = sources
+            return outline
+
         # Resolve course name using semantic search
         resolved_title = self.store._resolve_course_name(course_title)
         if not resolved_title:
@@ -159,7 +173,18 @@ class CourseOutlineTool(Tool):
             return f"Could not retrieve metadata for course '{resolved_title}'"
 
         # Format the outline
-        return self._format_outline(metadata)
+        outline = self._format_outline(metadata)
+
+        # Only successful outlines are cached; misses may be indexed later
+        self._outline_cache.pop(course_title, None)
+        if len(self._outline_cache) >= self.OUTLINE_CACHE_SIZE:
+            self._outline_cache.pop(next(iter(self._outline_cache)))
+        self._outline_cache[course_title] = (
+            time.monotonic() + self.OUTLINE_CACHE_TTL,
+            outline,
+            self.last_sources,
+        )
+        return outline
 
     def _format_outline(self, metadata: Dict[str, Any]) -> str:
         title = metadata.get("title", "Unknown")
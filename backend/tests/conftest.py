@@ -1,71 +1,86 @@
 """Shared fixtures and mocks for RAG chatbot tests."""
 
-import sys
-from pathlib import Path
+import json
 from unittest.mock import MagicMock, patch
 
 import pytest
+from ai_generator import _CLIENT_CACHE, AIGenerator
+from helpers import (
+    CourseStats,
+    QueryRequest,
+    QueryResponse,
+    StubVectorStore,
+    create_text_response,
+)
 
-# Add backend to path for imports
-backend_path = Path(__file__).parent.parent
-sys.path.insert(0, str(backend_path))
 
-from vector_store import SearchResults
+@pytest.fixture(autouse=True)
+def _reset_anthropic_clients():
+    """Drop shared Anthropic clients so each test sees its own patched class."""
+    _CLIENT_CACHE.clear()
+    yield
+    _CLIENT_CACHE.clear()
 
-# --- Helper functions for creating mock responses ---
 
+# --- AIGenerator Fixtures ---
 
-def create_text_response(text: str):
-    """Create mock Anthropic response with text content."""
-    response = MagicMock()
-    response.stop_reason = "end_turn"
-    text_block = MagicMock()
-    text_block.type = "text"
-    text_block.text = text
-    response.content = [text_block]
-    return response
 
+@pytest.fixture(scope="module")
+def _anthropic_class_patch():
+    """Patch anthropic.Anthropic once per test module."""
+    with patch("ai_generator.anthropic.Anthropic") as mock_anthropic_class:
+        yield mock_anthropic_class
 
-def create_tool_use_response(
-    tool_name: str, tool_input: dict, tool_id: str = "tool_123"
-):
-    """Create mock Anthropic response with tool_use content."""
-    response = MagicMock()
-    response.stop_reason = "tool_use"
-    tool_block = MagicMock()
-    tool_block.type = "tool_use"
-    tool_block.name = tool_name
-    tool_block.input = tool_input
-    tool_block.id = tool_id
-    response.content = [tool_block]
-    return response
+
+@pytest.fixture
+def patched_anthropic(_anthropic_class_patch):
+    """Patched Anthropic class (return_value is the client), reset after each test."""
+    yield _anthropic_class_patch
+    _anthropic_class_patch.reset_mock(return_value=True, side_effect=True)
+
+
+@pytest.fixture
+def ai_generator(patched_anthropic):
+    """AIGenerator built on the patched Anthropic client."""
+    return AIGenerator("test-key", "claude-sonnet-4-20250514")
 
 
 # --- API Testing Fixtures ---
 
+
 @pytest.fixture
 def mock_rag_system():
     """Mock RAGSystem for API tests."""
     rag = MagicMock()
     rag.query.return_value = (
         "This is a test answer about the course.",
-        [{"text": "Test Course - Lesson 1", "url": "https://example.com/lesson1"}]
+        [{"text": "Test Course - Lesson 1", "url": "https://example.com/lesson1"}],
     )
     rag.get_course_analytics.return_value = {
         "total_courses": 3,
-        "course_titles": ["Python Basics", "Machine Learning", "Web Development"]
+        "course_titles": ["Python Basics", "Machine Learning", "Web Development"],
     }
     rag.session_manager.create_session.return_value = "test-session-123"
+    rag.query_stream.side_effect = lambda query, session_id: iter(
+        [
+            {"type": "text", "text": "Streamed "},
+            {"type": "text", "text": "answer"},
+            {"type": "sources", "sources": []},
+        ]
+    )
     return rag
 
 
-@pytest.fixture
-def test_app(mock_rag_system):
-    """Create a test FastAPI app without static file mounting."""
+@pytest.fixture(scope="session")
+def test_app():
+    """Create a test FastAPI app without static file mounting.
+
+    Endpoints resolve the RAG system from app.state per request, so one app
+    serves every test with whichever mock the ``client`` fixture installs.
+    """
     from fastapi import FastAPI, HTTPException
     from fastapi.middleware.cors import CORSMiddleware
-    from pydantic import BaseModel
-    from typing import List, Optional
+    from fastapi.responses import StreamingResponse
 
     # Create a minimal test app with just the API endpoints
     app = FastAPI(title="Course Materials RAG System - Test")
@@ -78,51 +93,46 @@ def test_app(mock_rag_system):
         allow_headers=["*"],
     )
 
-    # Pydantic models (matching app.py)
-    class QueryRequest(BaseModel):
-        query: str
-        session_id: Optional[str] = None
-
-    class Source(BaseModel):
-        text: str
-        url: Optional[str] = None
-
-    class QueryResponse(BaseModel):
-        answer: str
-        sources: List[Source]
-        session_id: str
-
-    class CourseStats(BaseModel):
-        total_courses: int
-        course_titles: List[str]
-
-    # Store the mock so tests can access it
-    app.state.rag_system = mock_rag_system
+    app.state.rag_system = None
 
     @app.post("/api/query", response_model=QueryResponse)
     async def query_documents(request: QueryRequest):
+        rag_system = app.state.rag_system
         try:
             session_id = request.session_id
             if not session_id:
-                session_id = mock_rag_system.session_manager.create_session()
+                session_id = rag_system.session_manager.create_session()
 
-            answer, sources = mock_rag_system.query(request.query, session_id)
+            answer, sources = rag_system.query(request.query, session_id)
 
-            return QueryResponse(
-                answer=answer,
-                sources=sources,
-                session_id=session_id
-            )
+            return QueryResponse(answer=answer, sources=sources, session_id=session_id)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.post("/api/query/stream")
+    async def query_documents_stream(request: QueryRequest):
+        rag_system = app.state.rag_system
+        session_id = request.session_id
+        if not session_id:
+            session_id = rag_system.session_manager.create_session()
+
+        def event_stream():
+            yield json.dumps({"type": "session", "session_id": session_id}) + "\n"
+            try:
+                for event in rag_system.query_stream(request.query, session_id):
+                    yield json.dumps(event) + "\n"
+            except Exception as e:
+                yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+        return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
     @app.get("/api/courses", response_model=CourseStats)
     async def get_course_stats():
         try:
-            analytics = mock_rag_system.get_course_analytics()
+            analytics = app.state.rag_system.get_course_analytics()
             return CourseStats(
                 total_courses=analytics["total_courses"],
-                course_titles=analytics["course_titles"]
+                course_titles=analytics["course_titles"],
             )
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -134,11 +144,21 @@ def test_app(mock_rag_system):
     return app
 
 
-@pytest.fixture
-def client(test_app):
-    """FastAPI TestClient for API testing."""
+@pytest.fixture(scope="session")
+def _test_client(test_app):
+    """FastAPI TestClient shared across the session."""
     from fastapi.testclient import TestClient
-    return TestClient(test_app)
+
+    with TestClient(test_app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def client(_test_client, test_app, mock_rag_system):
+    """FastAPI TestClient for API testing, serving this test's mock RAGSystem."""
+    test_app.state.rag_system = mock_rag_system
+    yield _test_client
+    test_app.state.rag_system = None
 
 
 @pytest.fixture
@@ -152,46 +172,80 @@ def sample_query_request_with_session():
     """Sample query request with session ID."""
     return {
         "query": "Tell me more about neural networks",
-        "session_id": "existing-session-456"
+        "session_id": "existing-session-456",
     }
 
 
 # --- Fixtures ---
 
 
-@pytest.fixture
-def sample_search_results():
+@pytest.fixture(scope="session")
+def search_results_cls():
+    """SearchResults class, imported on first use.
+
+    vector_store pulls in chromadb, which is slow to import; deferring it keeps
+    runs that never touch search results from paying for it. Tests that need
+    it are skipped when chromadb is not installed.
+    """
+    pytest.importorskip("chromadb")
+    from vector_store import SearchResults
+
+    return SearchResults
+
+
+@pytest.fixture(scope="session")
+def sample_search_results(search_results_cls):
     """Pre-built SearchResults for various test scenarios."""
-    return SearchResults(
+    return search_results_cls(
         documents=["This is lesson content about machine learning."],
         metadata=[{"course_title": "AI Course", "lesson_number": 1, "chunk_index": 0}],
         distances=[0.5],
     )
 
 
-@pytest.fixture
-def empty_search_results():
+@pytest.fixture(scope="session")
+def empty_search_results(search_results_cls):
     """Empty SearchResults for no matches."""
-    return SearchResults(documents=[], metadata=[], distances=[])
+    return search_results_cls(documents=[], metadata=[], distances=[])
 
 
-@pytest.fixture
-def error_search_results():
+@pytest.fixture(scope="session")
+def error_search_results(search_results_cls):
     """SearchResults with error."""
-    return SearchResults.empty("Search error: connection failed")
+    return search_results_cls.empty("Search error: connection failed")
 
 
-@pytest.fixture
-def mock_vector_store(sample_search_results):
-    """Mock VectorStore with controllable search results."""
-    store = MagicMock()
-    store.search.return_value = sample_search_results
+def _set_vector_store_defaults(store, search_results):
+    store.search.return_value = search_results
     store.get_lesson_link.return_value = "https://example.com/lesson1"
     store._resolve_course_name.return_value = "AI Course"
+
+
+@pytest.fixture(scope="module")
+def _vector_store_mock(sample_search_results):
+    """MagicMock VectorStore built once per test module."""
+    store = MagicMock()
+    _set_vector_store_defaults(store, sample_search_results)
     return store
 
 
 @pytest.fixture
+def mock_vector_store(_vector_store_mock, sample_search_results):
+    """Mock VectorStore with controllable search results, restored after each test."""
+    yield _vector_store_mock
+    _vector_store_mock.reset_mock(return_value=True, side_effect=True)
+    _set_vector_store_defaults(_vector_store_mock, sample_search_results)
+
+
+@pytest.fixture
+def stub_vector_store(sample_search_results):
+    """Plain VectorStore stub; cheaper than a MagicMock for CourseSearchTool tests."""
+    return StubVectorStore(
+        search_result=sample_search_results, lesson_link="https://example.com/lesson1"
+    )
+
+
+@pytest.fixture(scope="session")
 def mock_chroma_collection():
     """Mock ChromaDB collection for VectorStore tests."""
     collection = MagicMock()
@@ -212,18 +266,34 @@ def mock_anthropic_client():
     return client
 
 
-@pytest.fixture
-def temp_chroma_path(tmp_path):
-    """Temporary ChromaDB path for integration tests."""
-    return str(tmp_path / "test_chroma_db")
+@pytest.fixture(scope="session")
+def temp_chroma_path(tmp_path_factory):
+    """Temporary ChromaDB path for integration tests.
 
+    Shared by the whole session: every consumer patches out ChromaDB, so the
+    directory is never read or written.
+    """
+    return str(tmp_path_factory.mktemp("chroma") / "test_chroma_db")
 
-@pytest.fixture
-def mock_tool_manager():
-    """Mock ToolManager for AIGenerator tests."""
-    manager = MagicMock()
+
+def _set_tool_manager_defaults(manager):
     manager.execute_tool.return_value = "Tool result: Found relevant content"
     manager.get_last_sources.return_value = [
         {"text": "AI Course - Lesson 1", "url": "https://example.com"}
     ]
+
+
+@pytest.fixture(scope="class")
+def _tool_manager_mock():
+    """MagicMock ToolManager built once per test class."""
+    manager = MagicMock()
+    _set_tool_manager_defaults(manager)
     return manager
+
+
+@pytest.fixture
+def mock_tool_manager(_tool_manager_mock):
+    """Mock ToolManager for AIGenerator tests, restored to defaults after each test."""
+    yield _tool_manager_mock
+    _tool_manager_mock.reset_mock(return_value=True, side_effect=True)
+    _set_tool_manager_defaults(_tool_manager_mock)
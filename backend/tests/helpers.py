@@ -1,29 +1,167 @@
 """Helper functions for tests."""
 
-from unittest.mock import MagicMock
+import json
+from functools import lru_cache
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Optional
 
+import anthropic
+from pydantic import BaseModel
 
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+@lru_cache(maxsize=None)
+def load_response_fixture(name: str) -> tuple:
+    """Load hand-written Messages API response bodies from fixtures/<name>.json.
+
+    Bodies are parsed into SDK Message objects once per session; they are
+    shared, so treat them as read-only.
+    """
+    bodies = json.loads((FIXTURE_DIR / f"{name}.json").read_text())
+    return tuple(anthropic.types.Message.model_validate(body) for body in bodies)
+
+
+class RecordingClient:
+    """Stand-in for ``client.messages.create`` that only records call kwargs."""
+
+    def __init__(self, responses):
+        self.calls = []
+        self._responses = iter(responses)
+
+    def messages_create(self, **kwargs):
+        self.calls.append(kwargs)
+        return next(self._responses)
+
+
+class FakeAnthropic(RecordingClient):
+    """Plain stand-in for an Anthropic client exposing ``messages.create``."""
+
+    def __init__(self, responses):
+        super().__init__(responses)
+        self.messages = SimpleNamespace(create=self.messages_create)
+
+
+class FakeMessageStream:
+    """Stand-in for the ``client.messages.stream`` context manager.
+
+    Streams ``chunks`` (by default the response's text blocks), then hands back
+    ``response`` as the final message.
+    """
+
+    def __init__(self, response, chunks=None):
+        self._response = response
+        if chunks is None:
+            chunks = [block.text for block in response.content if block.type == "text"]
+        self.text_stream = iter(chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def get_final_message(self):
+        return self._response
+
+
+class StubVectorStore:
+    """Plain stand-in for VectorStore covering what CourseSearchTool calls."""
+
+    def __init__(self, search_result=None, lesson_link=None):
+        self.search_result = search_result
+        self.lesson_link = lesson_link
+        self.calls = []
+
+    def search(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.search_result
+
+    def get_lesson_link(self, course_title, lesson_number):
+        return self.lesson_link
+
+
+class StubCollection:
+    """Plain stand-in for a Chroma collection's ``query``; records call kwargs."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.query_return = None
+        self.query_side_effect = None
+        self.query_calls = []
+
+    def query(self, **kwargs):
+        self.query_calls.append(kwargs)
+        if self.query_side_effect is not None:
+            raise self.query_side_effect
+        return self.query_return
+
+
+class StubClient:
+    """Plain stand-in for a Chroma client serving pre-built collections by name."""
+
+    def __init__(self, collections):
+        self._collections = collections
+
+    def get_or_create_collection(self, name, **kwargs):
+        return self._collections[name]
+
+
+@lru_cache(maxsize=128)
 def create_text_response(text: str):
-    """Create mock Anthropic response with text content."""
-    response = MagicMock()
-    response.stop_reason = "end_turn"
-    text_block = MagicMock()
-    text_block.type = "text"
-    text_block.text = text
-    response.content = [text_block]
-    return response
+    """Create stand-in Anthropic response with text content.
+
+    Responses are memoized per text, so treat them as read-only.
+    """
+    return SimpleNamespace(
+        stop_reason="end_turn",
+        content=[SimpleNamespace(type="text", text=text)],
+    )
 
 
 def create_tool_use_response(
     tool_name: str, tool_input: dict, tool_id: str = "tool_123"
 ):
-    """Create mock Anthropic response with tool_use content."""
-    response = MagicMock()
-    response.stop_reason = "tool_use"
-    tool_block = MagicMock()
-    tool_block.type = "tool_use"
-    tool_block.name = tool_name
-    tool_block.input = tool_input
-    tool_block.id = tool_id
-    response.content = [tool_block]
-    return response
+    """Create stand-in Anthropic response with tool_use content.
+
+    Responses are memoized per payload, so treat them as read-only.
+    """
+    return _cached_tool_use(tool_name, tuple(sorted(tool_input.items())), tool_id)
+
+
+@lru_cache(maxsize=128)
+def _cached_tool_use(tool_name: str, input_items: tuple, tool_id: str):
+    """Build a tool_use response from hashable (key, value) input items."""
+    return SimpleNamespace(
+        stop_reason="tool_use",
+        content=[
+            SimpleNamespace(
+                type="tool_use", name=tool_name, input=dict(input_items), id=tool_id
+            )
+        ],
+    )
+
+
+# Pydantic models (matching app.py)
+class QueryRequest(BaseModel):
+    query: str
+    session_id: Optional[str] = None
+
+
+class Source(BaseModel):
+    text: str
+    url: Optional[str] = None
+
+
+class QueryResponse(BaseModel):
+    answer: str
+    sources: List[Source]
+    session_id: str
+
+
+class CourseStats(BaseModel):
+    total_courses: int
+    course_titles: List[str]
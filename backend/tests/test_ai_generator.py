@@ -1,286 +1,700 @@
 """Tests for AIGenerator class."""
 
-import sys
-from pathlib import Path
-from unittest.mock import MagicMock, patch
-
+import json
+import re
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Optional
+from unittest.mock import MagicMock, call, patch
+
+import httpx
 import pytest
-
-# Add backend and tests to path
-backend_path = Path(__file__).parent.parent
-tests_path = Path(__file__).parent
-sys.path.insert(0, str(backend_path))
-sys.path.insert(0, str(tests_path))
-
-from helpers import create_text_response, create_tool_use_response
+from ai_generator import AIGenerator
+from helpers import (
+    FakeAnthropic,
+    FakeMessageStream,
+    RecordingClient,
+    create_text_response,
+    create_tool_use_response,
+    load_response_fixture,
+)
+
+# Shared tool definitions; the generator copies them before adding cache_control
+SEARCH_TOOL = {
+    "name": "search_course_content",
+    "description": "Search",
+    "input_schema": {"type": "object"},
+}
+OUTLINE_TOOL = {
+    "name": "get_course_outline",
+    "description": "Get outline",
+    "input_schema": {"type": "object"},
+}
+SEARCH_TOOLS = [SEARCH_TOOL]
+OUTLINE_TOOLS = [OUTLINE_TOOL, SEARCH_TOOL]
+
+# Pre-built read-only responses shared by the tool-use tests
+_SEARCH_TOOL_USE = create_tool_use_response("search_course_content", {"query": "test"})
+_DUMMY_TOOL_USE_1 = create_tool_use_response("search", {"q": "1"}, tool_id="t1")
+_DUMMY_TOOL_USE_2 = create_tool_use_response("search", {"q": "2"}, tool_id="t2")
+_FORCED_FINAL = create_text_response("Forced final response")
+_TWO_SEARCH_ROUNDS = (_DUMMY_TOOL_USE_1, _DUMMY_TOOL_USE_2)
+_RESP_MAX_ROUNDS = (_DUMMY_TOOL_USE_1, _DUMMY_TOOL_USE_2, _FORCED_FINAL)
+
+# Fixed response sequences, assigned directly as messages.create side_effects
+_RESP_TOOL_ANSWERED_TWICE = (
+    create_tool_use_response("search_course_content", {"query": "ML"}),
+    create_text_response("From tools"),
+    create_tool_use_response("search_course_content", {"query": "ML"}),
+    create_text_response("From tools again"),
+)
+_RESP_BATCH_FALLBACKS = (
+    create_tool_use_response("search", {"query": "Q1"}),
+    create_text_response("After tool"),
+    create_text_response("Retried"),
+)
+_RESP_SEARCH_THEN_TOOL_ERROR = (
+    _SEARCH_TOOL_USE,
+    create_text_response("I encountered an error while searching"),
+)
+_RESP_PARALLEL_THEN_TEXT = (
+    SimpleNamespace(
+        stop_reason="tool_use",
+        content=[
+            *create_tool_use_response(
+                "search_course_content", {"query": "first"}, tool_id="t1"
+            ).content,
+            *create_tool_use_response(
+                "get_course_outline", {"course_title": "AI Course"}, tool_id="t2"
+            ).content,
+        ],
+    ),
+    create_text_response("Combined answer"),
+)
+_RESP_TWO_TOOLS_THEN_TEXT = (
+    create_tool_use_response("tool1", {"query": "q1"}, tool_id="t1"),
+    create_tool_use_response("tool2", {"query": "q2"}, tool_id="t2"),
+    create_text_response("Handled error and got result"),
+)
+
+_RATE_LIMIT_RE = re.compile(r"API rate limit exceeded")
+_AUTH_ERROR_RE = re.compile(r"Authentication|API key")
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """A tool-loop run: API responses in order, and the expected final answer."""
+
+    name: str
+    responses: tuple
+    expected: str
+    tool_result: Optional[str] = None
+
+
+TOOL_SCENARIOS = [
+    Scenario(
+        "triggers_tool_use",
+        (
+            create_tool_use_response(
+                "search_course_content", {"query": "machine learning"}
+            ),
+            create_text_response("Final answer after tool use"),
+        ),
+        "Final answer after tool use",
+    ),
+    Scenario(
+        "single_tool",
+        (_SEARCH_TOOL_USE, create_text_response("Tool result incorporated")),
+        "Tool result incorporated",
+    ),
+    Scenario(
+        "early_exit",
+        (
+            create_tool_use_response("search", {"query": "test"}, tool_id="t1"),
+            create_text_response("Done after one tool"),
+        ),
+        "Done after one tool",
+    ),
+    Scenario(
+        "tool_returns_error",
+        (_SEARCH_TOOL_USE, create_text_response("No results found based on search")),
+        "No results found based on search",
+        tool_result="Error: No courses found",
+    ),
+    Scenario(
+        "two_rounds",
+        _RESP_MAX_ROUNDS,
+        "Forced final response",
+    ),
+]
+
+
+@pytest.fixture(autouse=True, scope="module")
+def _patch_anthropic(_anthropic_class_patch):
+    """Keep anthropic.Anthropic patched for every test in this module."""
+    return _anthropic_class_patch
+
+
+def _fake_generator(patched_anthropic, responses):
+    """AIGenerator on a FakeAnthropic client; returns (generator, fake)."""
+    fake = FakeAnthropic(responses)
+    patched_anthropic.return_value = fake
+    return AIGenerator("test-key", "claude-sonnet-4-20250514"), fake
+
+
+def _raw_generator(responses, requests):
+    """raw_http AIGenerator whose transport replays ``responses`` in order."""
+    bodies = iter(responses)
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=next(bodies))
+
+    generator = AIGenerator("test-key", "claude-sonnet-4-20250514", raw_http=True)
+    generator._http = httpx.Client(
+        base_url=AIGenerator.RAW_API_BASE_URL,
+        headers=generator._http.headers,
+        transport=httpx.MockTransport(handler),
+    )
+    return generator
 
 
 class TestAIGeneratorGenerateResponse:
     """Tests for AIGenerator.generate_response method."""
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_generate_response_direct_answer(self, mock_anthropic_class):
+    def test_generate_response_direct_answer(self, patched_anthropic):
         """Test response with no tool_use returns text directly."""
-        from ai_generator import AIGenerator
-
-        # Setup mock
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.return_value = create_text_response("Direct answer")
+        generator, fake = _fake_generator(
+            patched_anthropic, [create_text_response("Direct answer")]
+        )
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
         result = generator.generate_response("What is 2+2?")
 
         assert result == "Direct answer"
-        mock_client.messages.create.assert_called_once()
+        assert len(fake.calls) == 1
+        call_kwargs = fake.calls[0]
+        assert "tools" not in call_kwargs
+        assert "tool_choice" not in call_kwargs
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_generate_response_with_tools_no_use(self, mock_anthropic_class):
+    def test_generate_response_with_tools_no_use(self, ai_generator, patched_anthropic):
         """Test response with tools available but not used."""
-        from ai_generator import AIGenerator
-
-        mock_client = mock_anthropic_class.return_value
+        mock_client = patched_anthropic.return_value
         mock_client.messages.create.return_value = create_text_response(
             "Answer without tools"
         )
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "search",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
-        ]
-        result = generator.generate_response("Hello", tools=tools)
+        result = ai_generator.generate_response("Hello", tools=SEARCH_TOOLS)
 
         assert result == "Answer without tools"
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_generate_response_triggers_tool_use(
-        self, mock_anthropic_class, mock_tool_manager
-    ):
-        """Test that tool_use response triggers tool execution."""
-        from ai_generator import AIGenerator
+    def test_generate_response_with_conversation_history(self, patched_anthropic):
+        """Test that conversation history is sent as prior messages."""
+        generator, fake = _fake_generator(
+            patched_anthropic, [create_text_response("Response with context")]
+        )
 
-        mock_client = mock_anthropic_class.return_value
-        # First call returns tool_use, second returns final answer
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response(
-                "search_course_content", {"query": "machine learning"}
-            ),
-            create_text_response("Final answer after tool use"),
+        history = [
+            {"role": "user", "content": "Hi"},
+            {"role": "assistant", "content": "Hello!"},
         ]
+        generator.generate_response("Follow-up question", conversation_history=history)
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
+        # System prompt stays static; history precedes the new user turn
+        assert fake.calls[-1]["system"] == AIGenerator._CACHED_SYSTEM_BLOCK
+        messages = fake.calls[-1]["messages"]
+        assert messages == [
+            {"role": "user", "content": "Hi"},
             {
-                "name": "search_course_content",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
+                "role": "assistant",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Hello!",
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            },
+            {"role": "user", "content": "Follow-up question"},
         ]
-        result = generator.generate_response(
-            "What is ML?", tools=tools, tool_manager=mock_tool_manager
+        # Caller's history is left untouched
+        assert history[-1] == {"role": "assistant", "content": "Hello!"}
+
+    def test_generate_response_skips_empty_history_turns(self, patched_anthropic):
+        """Test that blank turns are dropped and never carry cache_control."""
+        generator, fake = _fake_generator(
+            patched_anthropic,
+            [create_text_response("First"), create_text_response("Second")],
         )
 
-        assert result == "Final answer after tool use"
-        # Verify tool was executed
-        mock_tool_manager.execute_tool.assert_called_once_with(
-            "search_course_content", query="machine learning"
+        generator.generate_response(
+            "Retry",
+            conversation_history=[
+                {"role": "user", "content": "Hi"},
+                {"role": "assistant", "content": ""},
+            ],
+        )
+        generator.generate_response(
+            "Retry",
+            conversation_history=[
+                {"role": "user", "content": " "},
+                {"role": "assistant", "content": ""},
+            ],
         )
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_generate_response_with_conversation_history(self, mock_anthropic_class):
-        """Test that conversation history is included in system prompt."""
-        from ai_generator import AIGenerator
+        assert fake.calls[0]["messages"] == [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Hi",
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
+            },
+            {"role": "user", "content": "Retry"},
+        ]
+        assert fake.calls[1]["messages"] == [{"role": "user", "content": "Retry"}]
 
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.return_value = create_text_response(
-            "Response with context"
+    def test_generate_response_system_prompt_cached(self, patched_anthropic):
+        """Test that the static system prompt is sent as a cacheable block."""
+        generator, fake = _fake_generator(
+            patched_anthropic, [create_text_response("Answer")]
         )
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        result = generator.generate_response(
-            "Follow-up question", conversation_history="User: Hi\nAssistant: Hello!"
-        )
+        generator.generate_response("Question")
 
-        # Verify system prompt includes history
-        call_args = mock_client.messages.create.call_args
-        system_content = call_args.kwargs.get("system", "")
-        assert "Previous conversation" in system_content
-        assert "User: Hi" in system_content
+        system_blocks = fake.calls[-1]["system"]
+        assert system_blocks == [
+            {
+                "type": "text",
+                "text": AIGenerator.SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_generate_response_api_error(self, mock_anthropic_class):
-        """Test that API errors propagate correctly."""
-        from ai_generator import AIGenerator
+    def test_generate_response_tools_cached(self, ai_generator, patched_anthropic):
+        """Test that the last tool definition is marked cacheable without mutation."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.return_value = create_text_response("Answer")
 
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.side_effect = Exception("API rate limit exceeded")
+        tools = [{"name": "get_course_outline"}, {"name": "search_course_content"}]
+        ai_generator.generate_response("First question", tools=tools)
+        ai_generator.generate_response(
+            "Second question", tools=[dict(t) for t in tools]
+        )
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        first_tools = mock_client.messages.create.call_args_list[0].kwargs["tools"]
+        second_tools = mock_client.messages.create.call_args_list[1].kwargs["tools"]
+        assert first_tools[-1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in first_tools[0]
+        assert first_tools is second_tools
+        # Caller's tool definitions are left untouched
+        assert "cache_control" not in tools[-1]
 
-        with pytest.raises(Exception) as exc_info:
-            generator.generate_response("Test query")
+    def test_generate_response_api_error(self, ai_generator, patched_anthropic):
+        """Test that API errors propagate correctly."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = Exception("API rate limit exceeded")
 
-        assert "API rate limit exceeded" in str(exc_info.value)
+        with pytest.raises(Exception, match=_RATE_LIMIT_RE):
+            ai_generator.generate_response("Test query")
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_generate_response_missing_api_key(self, mock_anthropic_class):
+    def test_generate_response_missing_api_key(self, patched_anthropic):
         """Test behavior with empty API key."""
-        from ai_generator import AIGenerator
-
-        mock_client = mock_anthropic_class.return_value
+        mock_client = patched_anthropic.return_value
         mock_client.messages.create.side_effect = Exception(
             "Authentication failed: API key required"
         )
 
         generator = AIGenerator("", "claude-sonnet-4-20250514")
 
-        with pytest.raises(Exception) as exc_info:
+        with pytest.raises(Exception, match=_AUTH_ERROR_RE):
             generator.generate_response("Test")
 
-        assert "Authentication" in str(exc_info.value) or "API key" in str(
-            exc_info.value
-        )
+    def test_generate_response_cached_for_repeat_query(self, patched_anthropic):
+        """Test that a repeated question is answered from the response cache."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.return_value = create_text_response("Cached")
 
+        generator = AIGenerator(
+            "test-key", "claude-sonnet-4-20250514", response_cache_size=8
+        )
+        first = generator.generate_response("What is 2+2?")
+        second = generator.generate_response("  what is 2+2? ")
+        generator.generate_response(
+            "What is 2+2?", conversation_history=[{"role": "user", "content": "Hi"}]
+        )
 
-class TestAIGeneratorToolExecution:
-    """Tests for tool execution behavior in AIGenerator."""
+        assert first == second == "Cached"
+        # Different history is a different cache entry
+        assert mock_client.messages.create.call_count == 2
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_handle_tool_execution_single_tool(
-        self, mock_anthropic_class, mock_tool_manager
+    def test_generate_response_tool_answers_not_cached(
+        self, patched_anthropic, mock_tool_manager
     ):
-        """Test execution of a single tool call."""
-        from ai_generator import AIGenerator
+        """Test that answers built from tool results are not cached."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = _RESP_TOOL_ANSWERED_TWICE
 
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response("search_course_content", {"query": "test"}),
-            create_text_response("Tool result incorporated"),
-        ]
+        generator = AIGenerator(
+            "test-key", "claude-sonnet-4-20250514", response_cache_size=8
+        )
+        generator.generate_response(
+            "What is ML?", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+        )
+        result = generator.generate_response(
+            "What is ML?", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+        )
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "search_course_content",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
+        assert result == "From tools again"
+        assert mock_tool_manager.execute_tool.call_count == 2
+
+    def test_generate_response_semantic_cache(self, patched_anthropic):
+        """Test that near-duplicate queries hit the semantic cache."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.return_value = create_text_response("Semantic")
+        embeddings = {
+            "What is ML?": [1.0, 0.0],
+            "Explain ML": [0.99, 0.01],
+            "Unrelated": [0.0, 1.0],
+        }
+
+        generator = AIGenerator(
+            "test-key",
+            "claude-sonnet-4-20250514",
+            response_cache_size=8,
+            embedding_function=lambda texts: [embeddings[t] for t in texts],
+        )
+        generator.generate_response("What is ML?")
+        result = generator.generate_response("Explain ML")
+        generator.generate_response("Unrelated")
+
+        assert result == "Semantic"
+        assert mock_client.messages.create.call_count == 2
+
+    def test_generate_response_semantic_cache_evicts_oldest(self, patched_anthropic):
+        """Test the semantic ring buffer replaces its oldest entry when full."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = [
+            create_text_response(text) for text in ("A", "B", "C", "A again")
         ]
+        embeddings = {
+            "Q1": [1.0, 0.0, 0.0],
+            "Q2": [0.0, 1.0, 0.0],
+            "Q3": [0.0, 0.0, 1.0],
+            "Q1 again": [0.99, 0.01, 0.0],
+            "Q3 again": [0.0, 0.01, 0.99],
+        }
+
+        generator = AIGenerator(
+            "test-key",
+            "claude-sonnet-4-20250514",
+            response_cache_size=2,
+            embedding_function=lambda texts: [embeddings[t] for t in texts],
+        )
+        for query in ("Q1", "Q2", "Q3"):
+            generator.generate_response(query)
+
+        assert generator.generate_response("Q3 again") == "C"
+        assert generator.generate_response("Q1 again") == "A again"
+        assert mock_client.messages.create.call_count == 4
+
+    def test_generate_response_cache_uses_cache_query(self, patched_anthropic):
+        """Test cache_query, not the prompt, is embedded and keyed on."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.return_value = create_text_response("Answer")
+        embedded = []
+
+        def embed(texts):
+            embedded.extend(texts)
+            return [[1.0, 0.0] for _ in texts]
+
+        generator = AIGenerator(
+            "test-key",
+            "claude-sonnet-4-20250514",
+            response_cache_size=8,
+            embedding_function=embed,
+        )
+        generator.generate_response("Prompt: What is ML?", cache_query="What is ML?")
         result = generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
+            "Other prompt: What is ML?", cache_query="what is ml?"
         )
 
-        assert result == "Tool result incorporated"
-        assert mock_client.messages.create.call_count == 2
+        assert result == "Answer"
+        assert embedded == ["What is ML?"]
+        assert mock_client.messages.create.call_args.kwargs["messages"] == [
+            {"role": "user", "content": "Prompt: What is ML?"}
+        ]
+        assert mock_client.messages.create.call_count == 1
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_handle_tool_execution_tool_returns_error(
-        self, mock_anthropic_class, mock_tool_manager
+    def test_generate_response_cache_off_by_default(
+        self, ai_generator, patched_anthropic
     ):
-        """Test handling when tool returns an error string."""
-        from ai_generator import AIGenerator
+        """Test that without a cache size every query calls the API."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.return_value = create_text_response("Answer")
 
-        mock_tool_manager.execute_tool.return_value = "Error: No courses found"
+        ai_generator.generate_response("Question")
+        ai_generator.generate_response("Question")
 
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response("search_course_content", {"query": "test"}),
-            create_text_response("No results found based on search"),
+        assert mock_client.messages.create.call_count == 2
+
+    def test_extract_text_response_skips_non_text_blocks(self, ai_generator):
+        """Test text is found after leading non-text blocks, or empty if absent."""
+        tool_block = SimpleNamespace(type="tool_use")
+        text_block = SimpleNamespace(type="text", text="Later text")
+
+        assert (
+            ai_generator._extract_text_response(
+                SimpleNamespace(content=[tool_block, text_block])
+            )
+            == "Later text"
+        )
+        assert ai_generator._extract_text_response(SimpleNamespace(content=[])) == ""
+        assert (
+            ai_generator._extract_text_response(SimpleNamespace(content=[tool_block]))
+            == ""
+        )
+
+    def test_tool_use_blocks_keeps_only_tool_use_in_order(self, ai_generator):
+        """Test only tool_use blocks are collected, in response order."""
+        text = SimpleNamespace(type="text", text="Let me search")
+        first = SimpleNamespace(type="tool_use", id="t1")
+        second = SimpleNamespace(type="tool_use", id="t2")
+
+        tool_use_blocks = ai_generator._tool_use_blocks(
+            SimpleNamespace(content=[text, first, second])
+        )
+
+        assert tool_use_blocks == [first, second]
+
+
+class TestAIGeneratorStreaming:
+    """Tests for AIGenerator.generate_response_stream method."""
+
+    def test_stream_without_tools(self, ai_generator, patched_anthropic):
+        """Test that a query without tools streams text chunks directly."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.stream.return_value = FakeMessageStream(
+            create_text_response("Hello world"), ["Hello", " world"]
+        )
+
+        chunks = list(ai_generator.generate_response_stream("Hi"))
+
+        assert chunks == ["Hello", " world"]
+        mock_client.messages.create.assert_not_called()
+        assert "tools" not in mock_client.messages.stream.call_args.kwargs
+
+    def test_stream_direct_answer_with_tools(self, ai_generator, patched_anthropic):
+        """Test that a direct answer from a tool-enabled call streams its deltas."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.stream.return_value = FakeMessageStream(
+            create_text_response("Direct answer"), ["Direct", " answer"]
+        )
+
+        chunks = list(ai_generator.generate_response_stream("Hi", tools=SEARCH_TOOLS))
+
+        assert chunks == ["Direct", " answer"]
+        mock_client.messages.create.assert_not_called()
+        assert "tools" in mock_client.messages.stream.call_args.kwargs
+
+    def test_stream_tool_round_then_answer(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
+        """Test that tools run between rounds and only the answer is yielded."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.stream.side_effect = [
+            FakeMessageStream(_SEARCH_TOOL_USE, ["Let me search."]),
+            FakeMessageStream(create_text_response("Found it"), ["Found", " it"]),
+        ]
+
+        chunks = list(
+            ai_generator.generate_response_stream(
+                "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+            )
+        )
+
+        # The tool round's preamble is dropped, as generate_response drops it
+        assert chunks == ["Found", " it"]
+        mock_tool_manager.execute_tool.assert_called_once_with(
+            "search_course_content", query="test"
+        )
+        final_kwargs = mock_client.messages.stream.call_args.kwargs
+        assert "tools" in final_kwargs
+        assert final_kwargs["messages"][2]["content"][0]["tool_use_id"] == "tool_123"
+        mock_client.messages.create.assert_not_called()
+
+    def test_stream_forced_final_after_max_rounds(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
+        """Test that the forced final answer streams without tools."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.stream.side_effect = [
+            FakeMessageStream(_DUMMY_TOOL_USE_1),
+            FakeMessageStream(_DUMMY_TOOL_USE_2),
+            FakeMessageStream(_FORCED_FINAL, ["Forced", " final"]),
+        ]
+
+        chunks = list(
+            ai_generator.generate_response_stream(
+                "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+            )
+        )
+
+        assert chunks == ["Forced", " final"]
+        assert mock_tool_manager.execute_tool.call_count == 2
+        assert mock_client.messages.stream.call_count == 3
+        stream_kwargs = mock_client.messages.stream.call_args.kwargs
+        assert "tools" not in stream_kwargs
+        assert len(stream_kwargs["messages"]) == 5
+
+
+class TestAIGeneratorBatch:
+    """Tests for AIGenerator.generate_responses_batch method."""
+
+    @staticmethod
+    def _batch_entry(custom_id, message=None, result_type="succeeded"):
+        return SimpleNamespace(
+            custom_id=custom_id,
+            result=SimpleNamespace(type=result_type, message=message),
+        )
+
+    @patch("ai_generator.time.sleep")
+    def test_batch_returns_responses_in_input_order(
+        self, mock_sleep, ai_generator, patched_anthropic
+    ):
+        """Test batch results are mapped back to query order after polling."""
+        mock_client = patched_anthropic.return_value
+        batches = mock_client.messages.batches
+        batches.create.return_value = SimpleNamespace(
+            id="batch_1", processing_status="in_progress"
+        )
+        batches.retrieve.return_value = SimpleNamespace(
+            id="batch_1", processing_status="ended"
+        )
+        batches.results.return_value = [
+            self._batch_entry("query-1", create_text_response("Second")),
+            self._batch_entry("query-0", create_text_response("First")),
         ]
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "search_course_content",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
+        results = ai_generator.generate_responses_batch(["Q1", "Q2"])
+
+        assert results == ["First", "Second"]
+        requests = batches.create.call_args.kwargs["requests"]
+        assert [r["custom_id"] for r in requests] == ["query-0", "query-1"]
+        assert requests[1]["params"]["messages"] == [{"role": "user", "content": "Q2"}]
+        batches.retrieve.assert_called_once_with("batch_1")
+        mock_sleep.assert_called_once()
+        mock_client.messages.create.assert_not_called()
+
+    def test_batch_falls_back_for_tool_use_and_errors(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
+        """Test tool_use and errored batch entries use the single-request path."""
+        mock_client = patched_anthropic.return_value
+        batches = mock_client.messages.batches
+        batches.create.return_value = SimpleNamespace(
+            id="batch_1", processing_status="ended"
+        )
+        batches.results.return_value = [
+            self._batch_entry("query-0", create_tool_use_response("search", {})),
+            self._batch_entry("query-1", result_type="errored"),
+            self._batch_entry("query-2", create_text_response("Batched")),
         ]
-        result = generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
+        mock_client.messages.create.side_effect = _RESP_BATCH_FALLBACKS
+
+        results = ai_generator.generate_responses_batch(
+            ["Q1", "Q2", "Q3"],
+            tools=SEARCH_TOOLS,
+            tool_manager=mock_tool_manager,
         )
 
-        # Should still get a response, even with error from tool
-        assert result == "No results found based on search"
+        assert results == ["After tool", "Retried", "Batched"]
+        assert mock_client.messages.create.call_count == 3
+
+    def test_batch_empty_queries(self, ai_generator, patched_anthropic):
+        """Test an empty query list makes no API calls."""
+
+        assert ai_generator.generate_responses_batch([]) == []
+        patched_anthropic.return_value.messages.batches.create.assert_not_called()
+
+
+class TestAIGeneratorToolExecution:
+    """Tests for tool execution behavior in AIGenerator."""
+
+    @pytest.mark.parametrize("scenario", TOOL_SCENARIOS, ids=lambda sc: sc.name)
+    def test_tool_use_flow(
+        self, ai_generator, patched_anthropic, mock_tool_manager, scenario
+    ):
+        """Each requested tool runs once, then the final text answer is returned."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = scenario.responses
+        if scenario.tool_result is not None:
+            mock_tool_manager.execute_tool.return_value = scenario.tool_result
+
+        result = ai_generator.generate_response(
+            "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+        )
+
+        assert result == scenario.expected
+        assert mock_tool_manager.execute_tool.call_args_list == [
+            call(block.name, **block.input)
+            for response in scenario.responses
+            for block in response.content
+            if block.type == "tool_use"
+        ]
+        assert mock_client.messages.create.call_count == len(scenario.responses)
 
-    @patch("ai_generator.anthropic.Anthropic")
     def test_handle_tool_execution_tool_raises_exception(
-        self, mock_anthropic_class, mock_tool_manager
+        self, ai_generator, patched_anthropic, mock_tool_manager
     ):
         """
         Test that tool exceptions are caught and handled gracefully.
         The error message should be passed to Claude as a tool result.
         """
-        from ai_generator import AIGenerator
-
         # Make tool raise an exception
         mock_tool_manager.execute_tool.side_effect = Exception(
             "Tool crashed unexpectedly"
         )
 
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response("search_course_content", {"query": "test"}),
-            create_text_response("I encountered an error while searching"),
-        ]
-
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "search_course_content",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
-        ]
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = _RESP_SEARCH_THEN_TOOL_ERROR
 
         # Should NOT raise - exception is caught and passed to Claude
-        result = generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
+        result = ai_generator.generate_response(
+            "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
         )
 
         assert result == "I encountered an error while searching"
 
         # Verify tool result contains error message
-        second_call = mock_client.messages.create.call_args_list[1]
-        messages = second_call.kwargs.get("messages", [])
+        messages = mock_client.messages.create.call_args_list[1].kwargs["messages"]
         tool_result_content = messages[2]["content"][0]["content"]
         assert "Tool execution error" in tool_result_content
         assert "Tool crashed unexpectedly" in tool_result_content
 
-    @patch("ai_generator.anthropic.Anthropic")
     def test_handle_tool_execution_message_format(
-        self, mock_anthropic_class, mock_tool_manager
+        self, ai_generator, patched_anthropic, mock_tool_manager
     ):
         """Test that tool results are formatted correctly for the API."""
-        from ai_generator import AIGenerator
-
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response(
-                "search_course_content", {"query": "test"}, tool_id="tool_abc"
-            ),
-            create_text_response("Final response"),
-        ]
+        recorder = RecordingClient(
+            [
+                create_tool_use_response(
+                    "search_course_content", {"query": "test"}, tool_id="tool_abc"
+                ),
+                create_text_response("Final response"),
+            ]
+        )
+        patched_anthropic.return_value.messages.create = recorder.messages_create
         mock_tool_manager.execute_tool.return_value = "Tool found: relevant content"
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "search_course_content",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
-        ]
-        generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
+        ai_generator.generate_response(
+            "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
         )
 
         # Check the second API call includes tool results
-        second_call = mock_client.messages.create.call_args_list[1]
-        messages = second_call.kwargs.get("messages", [])
+        messages = recorder.calls[1]["messages"]
 
         # Should have: user message, assistant tool_use, user tool_result
         assert len(messages) == 3
@@ -295,96 +709,227 @@ class TestAIGeneratorToolExecution:
         assert tool_results[0]["tool_use_id"] == "tool_abc"
         assert tool_results[0]["content"] == "Tool found: relevant content"
 
+    def test_handle_tool_execution_parallel_tools(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
+        """Test multiple tool_use blocks in one response all get results in order."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = _RESP_PARALLEL_THEN_TEXT
+        mock_tool_manager.execute_tool.side_effect = lambda name, **kwargs: (
+            f"{name} result"
+        )
+
+        result = ai_generator.generate_response(
+            "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+        )
+
+        assert result == "Combined answer"
+        assert mock_tool_manager.execute_tool.call_count == 2
+
+        messages = mock_client.messages.create.call_args_list[1].kwargs["messages"]
+        tool_results = messages[2]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["t1", "t2"]
+        assert [r["content"] for r in tool_results] == [
+            "search_course_content result",
+            "get_course_outline result",
+        ]
+
 
 class TestAIGeneratorConfiguration:
     """Tests for AIGenerator initialization and configuration."""
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_initialization(self, mock_anthropic_class):
+    def test_initialization(self, patched_anthropic):
         """Test AIGenerator initializes with correct parameters."""
-        from ai_generator import AIGenerator
-
         generator = AIGenerator("test-api-key", "claude-sonnet-4-20250514")
 
         assert generator.model == "claude-sonnet-4-20250514"
-        mock_anthropic_class.assert_called_once_with(api_key="test-api-key")
+        patched_anthropic.assert_called_once()
+        assert patched_anthropic.call_args.kwargs["api_key"] == "test-api-key"
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_base_params(self, mock_anthropic_class):
-        """Test base API parameters are set correctly."""
-        from ai_generator import AIGenerator
+    def test_client_shared_per_api_key(self, patched_anthropic):
+        """Test generators with the same API key reuse one client."""
+        patched_anthropic.side_effect = lambda **kwargs: MagicMock()
+
+        first = AIGenerator("key-a", "claude-sonnet-4-20250514")
+        second = AIGenerator("key-a", "claude-sonnet-4-20250514")
+        other = AIGenerator("key-b", "claude-sonnet-4-20250514")
+
+        assert first.client is second.client
+        assert other.client is not first.client
+        assert patched_anthropic.call_count == 2
 
+    def test_base_params(self, patched_anthropic):
+        """Test base API parameters are set correctly."""
         generator = AIGenerator("key", "claude-sonnet-4-20250514")
 
         assert generator.base_params["model"] == "claude-sonnet-4-20250514"
         assert generator.base_params["temperature"] == 0
         assert generator.base_params["max_tokens"] == 800
 
+    def test_parallel_tool_use_disabled_by_default(self, patched_anthropic):
+        """Test tool_choice disables parallel tool use unless opted in."""
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.return_value = create_text_response("Answer")
+
+        AIGenerator("key", "claude-sonnet-4-20250514").generate_response(
+            "Question", tools=SEARCH_TOOLS
+        )
+        assert mock_client.messages.create.call_args.kwargs["tool_choice"] == {
+            "type": "auto",
+            "disable_parallel_tool_use": True,
+        }
+
+        AIGenerator(
+            "key", "claude-sonnet-4-20250514", parallel_tools=True
+        ).generate_response("Question", tools=SEARCH_TOOLS)
+        assert mock_client.messages.create.call_args.kwargs["tool_choice"] == {
+            "type": "auto"
+        }
+
+
+class TestAIGeneratorRawHttp:
+    """Tests for the raw_http Messages API fast path."""
+
+    def test_raw_http_tool_loop(self, patched_anthropic, mock_tool_manager):
+        """Test the tool loop runs over raw HTTP without touching the SDK."""
+        requests = []
+        generator = _raw_generator(
+            [
+                {
+                    "stop_reason": "tool_use",
+                    "content": [
+                        {
+                            "type": "tool_use",
+                            "id": "t1",
+                            "name": "search_course_content",
+                            "input": {"query": "ML"},
+                        }
+                    ],
+                },
+                {
+                    "stop_reason": "end_turn",
+                    "content": [{"type": "text", "text": "Raw answer"}],
+                },
+            ],
+            requests,
+        )
+
+        result = generator.generate_response(
+            "What is ML?", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+        )
+
+        assert result == "Raw answer"
+        patched_anthropic.return_value.messages.create.assert_not_called()
+        mock_tool_manager.execute_tool.assert_called_once_with(
+            "search_course_content", query="ML"
+        )
+        assert requests[0].url.path == "/v1/messages"
+        assert requests[0].headers["x-api-key"] == "test-key"
+        assert requests[0].headers["anthropic-version"] == "2023-06-01"
+        second_body = json.loads(requests[1].content)
+        assert second_body["messages"][1]["content"][0]["id"] == "t1"
+        assert second_body["messages"][2]["content"][0]["tool_use_id"] == "t1"
+
+    @patch("ai_generator.time.sleep")
+    def test_raw_http_error_status_raises(self, mock_sleep, patched_anthropic):
+        """Test a persistent 429 is retried with backoff, then raised."""
+        attempts = []
+        generator = AIGenerator("test-key", "claude-sonnet-4-20250514", raw_http=True)
+        generator._http = httpx.Client(
+            base_url=AIGenerator.RAW_API_BASE_URL,
+            transport=httpx.MockTransport(
+                lambda request: attempts.append(request) or httpx.Response(429)
+            ),
+        )
+
+        with pytest.raises(httpx.HTTPStatusError):
+            generator.generate_response("Question")
+
+        assert len(attempts) == AIGenerator.RAW_MAX_RETRIES + 1
+        assert mock_sleep.call_args_list == [call(0.5), call(1.0)]
+
+    @patch("ai_generator.time.sleep")
+    def test_raw_http_retries_transient_failures(self, mock_sleep, patched_anthropic):
+        """Test connection errors and 5xx are retried until a response succeeds."""
+        outcomes = iter(
+            [
+                httpx.ConnectError("connection reset"),
+                httpx.Response(529, headers={"retry-after": "2"}),
+                httpx.Response(
+                    200,
+                    json={
+                        "stop_reason": "end_turn",
+                        "content": [{"type": "text", "text": "Recovered"}],
+                    },
+                ),
+            ]
+        )
+
+        def handler(request):
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        generator = AIGenerator("test-key", "claude-sonnet-4-20250514", raw_http=True)
+        generator._http = httpx.Client(
+            base_url=AIGenerator.RAW_API_BASE_URL,
+            transport=httpx.MockTransport(handler),
+        )
+
+        assert generator.generate_response("Question") == "Recovered"
+        assert mock_sleep.call_args_list == [call(0.5), call(2.0)]
+
+    @patch("ai_generator.time.sleep")
+    def test_raw_http_client_errors_not_retried(self, mock_sleep, patched_anthropic):
+        """Test a 400 raises on the first attempt."""
+        attempts = []
+        generator = AIGenerator("test-key", "claude-sonnet-4-20250514", raw_http=True)
+        generator._http = httpx.Client(
+            base_url=AIGenerator.RAW_API_BASE_URL,
+            transport=httpx.MockTransport(
+                lambda request: attempts.append(request) or httpx.Response(400)
+            ),
+        )
+
+        with pytest.raises(httpx.HTTPStatusError):
+            generator.generate_response("Question")
+
+        assert len(attempts) == 1
+        mock_sleep.assert_not_called()
+
 
 class TestAIGeneratorSequentialToolCalling:
     """Tests for sequential tool calling (max 2 rounds)."""
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_two_sequential_tool_calls(self, mock_anthropic_class, mock_tool_manager):
+    def test_two_sequential_tool_calls(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
         """Two tool calls execute, then final response returned."""
-        from ai_generator import AIGenerator
-
-        mock_client = mock_anthropic_class.return_value
         # Round 1: tool_use, Round 2: tool_use, Final: text
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response(
-                "get_course_outline", {"course_title": "AI Course"}, tool_id="t1"
-            ),
-            create_tool_use_response(
-                "search_course_content", {"query": "machine learning"}, tool_id="t2"
-            ),
-            create_text_response("Final answer after two tool calls"),
-        ]
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = load_response_fixture(
+            "handwritten_two_sequential_tool_calls"
+        )
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "get_course_outline",
-                "description": "Get outline",
-                "input_schema": {"type": "object"},
-            },
-            {
-                "name": "search_course_content",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            },
-        ]
-        result = generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
+        result = ai_generator.generate_response(
+            "Query", tools=OUTLINE_TOOLS, tool_manager=mock_tool_manager
         )
 
         assert result == "Final answer after two tool calls"
         assert mock_tool_manager.execute_tool.call_count == 2
         assert mock_client.messages.create.call_count == 3
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_max_rounds_enforced(self, mock_anthropic_class, mock_tool_manager):
+    def test_max_rounds_enforced(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
         """Loop exits after 2 rounds even if Claude wants more tools."""
-        from ai_generator import AIGenerator
-
-        mock_client = mock_anthropic_class.return_value
+        mock_client = patched_anthropic.return_value
         # Claude keeps requesting tools, but should be forced to respond after 2 rounds
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response("search", {"q": "1"}, tool_id="t1"),
-            create_tool_use_response("search", {"q": "2"}, tool_id="t2"),
-            create_text_response("Forced final response"),
-        ]
+        mock_client.messages.create.side_effect = _RESP_MAX_ROUNDS
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "search",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
-        ]
-        result = generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
+        result = ai_generator.generate_response(
+            "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
         )
 
         assert result == "Forced final response"
@@ -392,91 +937,48 @@ class TestAIGeneratorSequentialToolCalling:
         assert mock_tool_manager.execute_tool.call_count == 2
 
         # Verify final call has no tools
-        final_call = mock_client.messages.create.call_args_list[2]
-        assert "tools" not in final_call.kwargs
-
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_early_exit_no_tool_use(self, mock_anthropic_class, mock_tool_manager):
-        """Immediate return when Claude doesn't request more tools after first."""
-        from ai_generator import AIGenerator
-
-        mock_client = mock_anthropic_class.return_value
-        # First call uses tool, second doesn't
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response("search", {"query": "test"}, tool_id="t1"),
-            create_text_response("Done after one tool"),
-        ]
-
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [
-            {
-                "name": "search",
-                "description": "Search",
-                "input_schema": {"type": "object"},
-            }
-        ]
-        result = generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
-        )
+        final_kwargs = mock_client.messages.create.call_args_list[2].kwargs
+        assert "tools" not in final_kwargs
 
-        assert result == "Done after one tool"
-        assert mock_tool_manager.execute_tool.call_count == 1
-        assert mock_client.messages.create.call_count == 2
-
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_tool_error_passed_to_claude(self, mock_anthropic_class, mock_tool_manager):
+    def test_tool_error_passed_to_claude(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
         """Tool errors included in results, loop continues."""
-        from ai_generator import AIGenerator
-
         # First tool fails, but loop continues
         mock_tool_manager.execute_tool.side_effect = [
             Exception("Tool crashed"),
             "Success result",
         ]
 
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response("tool1", {"query": "q1"}, tool_id="t1"),
-            create_tool_use_response("tool2", {"query": "q2"}, tool_id="t2"),
-            create_text_response("Handled error and got result"),
-        ]
+        mock_client = patched_anthropic.return_value
+        mock_client.messages.create.side_effect = _RESP_TWO_TOOLS_THEN_TEXT
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
         tools = [{"name": "tool1"}, {"name": "tool2"}]
-        result = generator.generate_response(
+        result = ai_generator.generate_response(
             "Query", tools=tools, tool_manager=mock_tool_manager
         )
 
         assert result == "Handled error and got result"
 
         # Verify error was passed in first tool result
-        second_call = mock_client.messages.create.call_args_list[1]
-        messages = second_call.kwargs.get("messages", [])
+        messages = mock_client.messages.create.call_args_list[1].kwargs["messages"]
         tool_result_content = messages[2]["content"][0]["content"]
         assert "Tool execution error" in tool_result_content
         assert "Tool crashed" in tool_result_content
 
-    @patch("ai_generator.anthropic.Anthropic")
-    def test_message_accumulation(self, mock_anthropic_class, mock_tool_manager):
+    def test_message_accumulation(
+        self, ai_generator, patched_anthropic, mock_tool_manager
+    ):
         """Messages accumulate correctly across rounds."""
-        from ai_generator import AIGenerator
-
-        mock_client = mock_anthropic_class.return_value
-        mock_client.messages.create.side_effect = [
-            create_tool_use_response("search", {"q": "1"}, tool_id="t1"),
-            create_tool_use_response("search", {"q": "2"}, tool_id="t2"),
-            create_text_response("Final"),
-        ]
+        recorder = RecordingClient(_RESP_MAX_ROUNDS)
+        patched_anthropic.return_value.messages.create = recorder.messages_create
 
-        generator = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        tools = [{"name": "search"}]
-        generator.generate_response(
-            "Query", tools=tools, tool_manager=mock_tool_manager
+        ai_generator.generate_response(
+            "Query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
         )
 
         # Check final call has accumulated messages
-        final_call = mock_client.messages.create.call_args_list[2]
-        messages = final_call.kwargs["messages"]
+        messages = recorder.calls[2]["messages"]
 
         # Should have: user, assistant, user (tool result), assistant, user (tool result)
         assert len(messages) == 5
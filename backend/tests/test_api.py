@@ -1,5 +1,12 @@
 """Tests for FastAPI endpoints."""
+
+import json
+
 import pytest
+from helpers import CourseStats, QueryResponse
+
+# Keep endpoint tests on one xdist worker so its session-scoped TestClient stays warm
+pytestmark = pytest.mark.xdist_group("api")
 
 
 class TestRootEndpoint:
@@ -19,7 +26,9 @@ class TestQueryEndpoint:
     """Tests for the /api/query endpoint."""
 
     @pytest.mark.api
-    def test_query_with_valid_request(self, client, sample_query_request, mock_rag_system):
+    def test_query_with_valid_request(
+        self, client, sample_query_request, mock_rag_system
+    ):
         """POST /api/query with valid query returns answer and sources."""
         response = client.post("/api/query", json=sample_query_request)
 
@@ -33,7 +42,9 @@ class TestQueryEndpoint:
         assert data["sources"][0]["text"] == "Test Course - Lesson 1"
 
     @pytest.mark.api
-    def test_query_creates_session_when_not_provided(self, client, sample_query_request, mock_rag_system):
+    def test_query_creates_session_when_not_provided(
+        self, client, sample_query_request, mock_rag_system
+    ):
         """POST /api/query without session_id creates a new session."""
         response = client.post("/api/query", json=sample_query_request)
 
@@ -43,7 +54,9 @@ class TestQueryEndpoint:
         mock_rag_system.session_manager.create_session.assert_called_once()
 
     @pytest.mark.api
-    def test_query_uses_provided_session(self, client, sample_query_request_with_session, mock_rag_system):
+    def test_query_uses_provided_session(
+        self, client, sample_query_request_with_session, mock_rag_system
+    ):
         """POST /api/query with session_id uses the provided session."""
         response = client.post("/api/query", json=sample_query_request_with_session)
 
@@ -51,8 +64,7 @@ class TestQueryEndpoint:
         data = response.json()
         assert data["session_id"] == "existing-session-456"
         mock_rag_system.query.assert_called_once_with(
-            "Tell me more about neural networks",
-            "existing-session-456"
+            "Tell me more about neural networks", "existing-session-456"
         )
 
     @pytest.mark.api
@@ -90,6 +102,35 @@ class TestQueryEndpoint:
         assert response.status_code == 200
 
 
+class TestQueryStreamEndpoint:
+    """Tests for the /api/query/stream endpoint."""
+
+    @pytest.mark.api
+    def test_query_stream_emits_ndjson_events(self, client, sample_query_request):
+        """POST /api/query/stream streams session, text and sources events."""
+        response = client.post("/api/query/stream", json=sample_query_request)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events[0] == {"type": "session", "session_id": "test-session-123"}
+        assert "".join(e["text"] for e in events if e["type"] == "text") == (
+            "Streamed answer"
+        )
+        assert events[-1] == {"type": "sources", "sources": []}
+
+    @pytest.mark.api
+    def test_query_stream_reports_errors_in_stream(self, client, mock_rag_system):
+        """POST /api/query/stream emits an error event when the RAG system fails."""
+        mock_rag_system.query_stream.side_effect = Exception("Stream error")
+
+        response = client.post("/api/query/stream", json={"query": "test"})
+
+        assert response.status_code == 200
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert events[-1] == {"type": "error", "detail": "Stream error"}
+
+
 class TestCoursesEndpoint:
     """Tests for the /api/courses endpoint."""
 
@@ -130,7 +171,7 @@ class TestCoursesEndpoint:
         """GET /api/courses handles empty course catalog."""
         mock_rag_system.get_course_analytics.return_value = {
             "total_courses": 0,
-            "course_titles": []
+            "course_titles": [],
         }
 
         response = client.get("/api/courses")
@@ -148,27 +189,15 @@ class TestAPIResponseFormat:
     def test_query_response_has_correct_structure(self, client, sample_query_request):
         """Query response matches QueryResponse model."""
         response = client.post("/api/query", json=sample_query_request)
-        data = response.json()
-
-        assert isinstance(data["answer"], str)
-        assert isinstance(data["sources"], list)
-        assert isinstance(data["session_id"], str)
 
-        for source in data["sources"]:
-            assert "text" in source
-            assert isinstance(source["text"], str)
+        QueryResponse.model_validate(response.json(), strict=True)
 
     @pytest.mark.api
     def test_courses_response_has_correct_structure(self, client):
         """Courses response matches CourseStats model."""
         response = client.get("/api/courses")
-        data = response.json()
-
-        assert isinstance(data["total_courses"], int)
-        assert isinstance(data["course_titles"], list)
 
-        for title in data["course_titles"]:
-            assert isinstance(title, str)
+        CourseStats.model_validate(response.json(), strict=True)
 
     @pytest.mark.api
     def test_error_response_format(self, client, mock_rag_system):
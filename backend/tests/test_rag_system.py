@@ -1,84 +1,120 @@
 """Integration tests for RAGSystem."""
 
-import sys
-from dataclasses import dataclass
-from pathlib import Path
+import copy
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-# Add backend and tests to path
-backend_path = Path(__file__).parent.parent
-tests_path = Path(__file__).parent
-sys.path.insert(0, str(backend_path))
-sys.path.insert(0, str(tests_path))
+# rag_system imports vector_store, which needs chromadb
+pytest.importorskip("chromadb")
 
 from helpers import create_text_response, create_tool_use_response
+from rag_system import RAGSystem
+from vector_store import SearchResults
 
+# Default test configuration; make_config copies it with per-test overrides
+_DEFAULT_CONFIG = SimpleNamespace(
+    ANTHROPIC_API_KEY="test-api-key",
+    ANTHROPIC_MODEL="claude-sonnet-4-20250514",
+    EMBEDDING_MODEL="all-MiniLM-L6-v2",
+    CHUNK_SIZE=800,
+    CHUNK_OVERLAP=100,
+    MAX_RESULTS=5,
+    MAX_HISTORY=2,
+    RESPONSE_CACHE_SIZE=0,
+    SEMANTIC_CACHE=False,
+    CHROMA_PATH="./test_chroma_db",
+)
 
-@dataclass
-class MockConfig:
-    """Mock configuration for testing."""
 
-    ANTHROPIC_API_KEY: str = "test-api-key"
-    ANTHROPIC_MODEL: str = "claude-sonnet-4-20250514"
-    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
-    CHUNK_SIZE: int = 800
-    CHUNK_OVERLAP: int = 100
-    MAX_RESULTS: int = 5
-    MAX_HISTORY: int = 2
-    CHROMA_PATH: str = "./test_chroma_db"
+def make_config(**overrides):
+    """Return a copy of the default test config with the given fields replaced."""
+    config = copy.copy(_DEFAULT_CONFIG)
+    config.__dict__.update(overrides)
+    return config
+
+
+# Baseline VectorStore behaviour, applied to each test's fresh mock instance
+_VS_DEFAULTS = {
+    "search.return_value": SearchResults(documents=[], metadata=[], distances=[]),
+    "get_lesson_link.return_value": None,
+}
+
+# Shared source entry; tests only ever read it, never mutate it
+_SRC_A = {"text": "Course A - Lesson 1", "url": "https://example.com"}
+
+_COLLABORATORS = ("VectorStore", "AIGenerator", "DocumentProcessor", "SessionManager")
+
+
+@pytest.fixture(scope="class")
+def _rag_collaborator_mocks():
+    """Swap RAGSystem's four collaborators for MagicMocks once per test class."""
+    mocks = {name: MagicMock() for name in _COLLABORATORS}
+    with pytest.MonkeyPatch.context() as mp:
+        for name, mock in mocks.items():
+            mp.setattr(f"rag_system.{name}", mock)
+        yield mocks
+
+
+@pytest.fixture
+def rag_mocks(_rag_collaborator_mocks):
+    """RAGSystem's collaborator mocks keyed by name, reset after each test.
+
+    The AIGenerator mock answers "Answer" unless a test overrides it.
+    """
+    mocks = _rag_collaborator_mocks
+    mocks["VectorStore"].return_value.configure_mock(**_VS_DEFAULTS)
+    mocks["AIGenerator"].return_value.generate_response.return_value = "Answer"
+    yield mocks
+    for mock in mocks.values():
+        mock.reset_mock(return_value=True, side_effect=True)
+
+
+@pytest.fixture
+def patched_vector_store():
+    """Patch only rag_system.VectorStore; yields the mock class."""
+    with patch("rag_system.VectorStore") as mock_vs_class:
+        mock_vs_class.return_value.configure_mock(**_VS_DEFAULTS)
+        yield mock_vs_class
+
+
+@pytest.fixture
+def rag(rag_mocks, temp_chroma_path):
+    """RAGSystem built on the rag_mocks collaborators."""
+    return RAGSystem(make_config(CHROMA_PATH=temp_chroma_path))
 
 
 class TestRAGSystemQuery:
     """Tests for RAGSystem.query method."""
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_query_success_with_response(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
+    def test_query_success_with_response(self, rag_mocks, rag):
         """Test successful query returns response and sources."""
-        from rag_system import RAGSystem
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
+        mock_ai_gen = rag_mocks["AIGenerator"]
+        mock_vs = rag_mocks["VectorStore"]
 
         # Setup mocks
         mock_ai_gen.return_value.generate_response.return_value = "This is the answer"
         mock_vs.return_value.get_lesson_link.return_value = "https://example.com"
 
-        rag = RAGSystem(config)
-
         # Manually set sources on the search tool
-        rag.search_tool.last_sources = [
-            {"text": "Course A - Lesson 1", "url": "https://example.com"}
-        ]
+        rag.search_tool.last_sources = [_SRC_A]
 
         response, sources = rag.query("What is machine learning?")
 
         assert response == "This is the answer"
-        assert len(sources) == 1
+        assert sources == [_SRC_A]
         mock_ai_gen.return_value.generate_response.assert_called_once()
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_query_with_session_id(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
+    def test_query_with_session_id(self, rag_mocks, rag):
         """Test query with session_id updates conversation history."""
-        from rag_system import RAGSystem
+        mock_session = rag_mocks["SessionManager"]
 
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-        mock_ai_gen.return_value.generate_response.return_value = "Answer"
-        mock_session.return_value.get_conversation_history.return_value = (
-            "Previous context"
-        )
+        mock_session.return_value.get_conversation_history.return_value = [
+            {"role": "user", "content": "Previous question"},
+            {"role": "assistant", "content": "Previous answer"},
+        ]
 
-        rag = RAGSystem(config)
         response, _ = rag.query("Follow-up question", session_id="session_123")
 
         # Verify history was retrieved
@@ -89,43 +125,19 @@ class TestRAGSystemQuery:
         # Verify exchange was added
         mock_session.return_value.add_exchange.assert_called_once()
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_query_without_session_id(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
+    def test_query_without_session_id(self, rag_mocks, rag):
         """Test query without session_id still works."""
-        from rag_system import RAGSystem
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-        mock_ai_gen.return_value.generate_response.return_value = "Answer"
+        mock_session = rag_mocks["SessionManager"]
 
-        rag = RAGSystem(config)
         response, _ = rag.query("Question without session")
 
         assert response == "Answer"
         # History should not be retrieved
         mock_session.return_value.get_conversation_history.assert_not_called()
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_query_sources_reset_after_retrieval(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
+    def test_query_sources_reset_after_retrieval(self, rag):
         """Test that sources are cleared after query returns."""
-        from rag_system import RAGSystem
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-        mock_ai_gen.return_value.generate_response.return_value = "Answer"
-
-        rag = RAGSystem(config)
-        rag.search_tool.last_sources = [
-            {"text": "Source", "url": "https://example.com"}
-        ]
+        rag.search_tool.last_sources = [_SRC_A]
 
         _, sources = rag.query("Question")
 
@@ -135,42 +147,87 @@ class TestRAGSystemQuery:
         # After query, sources should be reset
         assert rag.search_tool.last_sources == []
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_query_ai_generator_exception(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
+    def test_query_ai_generator_exception(self, rag_mocks, rag):
         """Test that AI generator exceptions propagate."""
-        from rag_system import RAGSystem
+        mock_ai_gen = rag_mocks["AIGenerator"]
 
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
         mock_ai_gen.return_value.generate_response.side_effect = Exception("API Error")
 
-        rag = RAGSystem(config)
-
         with pytest.raises(Exception) as exc_info:
             rag.query("Question")
 
         assert "API Error" in str(exc_info.value)
 
+    def test_query_stream_yields_text_then_sources(self, rag_mocks, rag):
+        """Test streamed query yields text events, then sources, then saves history."""
+        mock_session = rag_mocks["SessionManager"]
+        mock_ai_gen = rag_mocks["AIGenerator"]
+
+        mock_ai_gen.return_value.generate_response_stream.return_value = iter(
+            ["Part 1", " part 2"]
+        )
+        rag.search_tool.last_sources = [_SRC_A]
+
+        events = list(rag.query_stream("Question", session_id="session_1"))
+
+        assert events == [
+            {"type": "text", "text": "Part 1"},
+            {"type": "text", "text": " part 2"},
+            {
+                "type": "sources",
+                "sources": [_SRC_A],
+            },
+        ]
+        assert rag.search_tool.last_sources == []
+        mock_session.return_value.add_exchange.assert_called_once_with(
+            "session_1", "Question", "Part 1 part 2"
+        )
+
+    def test_query_stream_disconnect_resets_sources(self, rag_mocks, rag):
+        """Test an abandoned stream clears sources and records no exchange."""
+        mock_session = rag_mocks["SessionManager"]
+        mock_ai_gen = rag_mocks["AIGenerator"]
+
+        mock_ai_gen.return_value.generate_response_stream.return_value = iter(
+            ["Part 1", " part 2"]
+        )
+        rag.search_tool.last_sources = [_SRC_A]
+
+        events = rag.query_stream("Question", session_id="session_1")
+        assert next(events) == {"type": "text", "text": "Part 1"}
+        events.close()
+
+        assert rag.search_tool.last_sources == []
+        mock_session.return_value.add_exchange.assert_not_called()
+
+    def test_query_stream_error_resets_sources(self, rag_mocks, rag):
+        """Test a stream that fails partway still clears sources."""
+        mock_session = rag_mocks["SessionManager"]
+        mock_ai_gen = rag_mocks["AIGenerator"]
+
+        def failing_stream(**kwargs):
+            yield "Part 1"
+            raise RuntimeError("Stream dropped")
+
+        mock_ai_gen.return_value.generate_response_stream.side_effect = failing_stream
+        rag.search_tool.last_sources = [_SRC_A]
+
+        with pytest.raises(RuntimeError, match="Stream dropped"):
+            list(rag.query_stream("Question", session_id="session_1"))
+
+        assert rag.search_tool.last_sources == []
+        mock_session.return_value.add_exchange.assert_not_called()
+
 
 class TestRAGSystemInitialization:
     """Tests for RAGSystem initialization."""
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_initialization_creates_components(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
+    def test_initialization_creates_components(self, rag_mocks, rag):
         """Test that RAGSystem creates all required components."""
-        from rag_system import RAGSystem
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-        rag = RAGSystem(config)
+        mock_session = rag_mocks["SessionManager"]
+        mock_doc_proc = rag_mocks["DocumentProcessor"]
+        mock_ai_gen = rag_mocks["AIGenerator"]
+        mock_vs = rag_mocks["VectorStore"]
 
         # Verify all components are initialized
         mock_doc_proc.assert_called_once()
@@ -183,41 +240,50 @@ class TestRAGSystemInitialization:
         assert "search_course_content" in rag.tool_manager.tools
         assert "get_course_outline" in rag.tool_manager.tools
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_initialization_with_empty_api_key(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
+    def test_initialization_with_empty_api_key(self, rag_mocks, temp_chroma_path):
         """Test initialization with empty API key (deferred failure)."""
-        from rag_system import RAGSystem
+        mock_ai_gen = rag_mocks["AIGenerator"]
 
-        config = MockConfig(ANTHROPIC_API_KEY="", CHROMA_PATH=temp_chroma_path)
+        config = make_config(ANTHROPIC_API_KEY="", CHROMA_PATH=temp_chroma_path)
 
         # Initialization should succeed (API key not validated until query)
         rag = RAGSystem(config)
 
         # Verify AIGenerator was called with empty key
-        mock_ai_gen.assert_called_with("", "claude-sonnet-4-20250514")
+        mock_ai_gen.assert_called_with(
+            "",
+            "claude-sonnet-4-20250514",
+            response_cache_size=0,
+            embedding_function=None,
+        )
 
+    def test_initialization_semantic_cache_uses_store_embeddings(
+        self, rag_mocks, temp_chroma_path
+    ):
+        """Test SEMANTIC_CACHE hands the vector store's embedder to AIGenerator."""
+        mock_ai_gen = rag_mocks["AIGenerator"]
+        mock_vs = rag_mocks["VectorStore"]
+
+        RAGSystem(
+            make_config(
+                RESPONSE_CACHE_SIZE=64,
+                SEMANTIC_CACHE=True,
+                CHROMA_PATH=temp_chroma_path,
+            )
+        )
 
-class TestDiagnoseQueryFailure:
-    """Diagnostic tests to identify which component causes query failures."""
+        assert mock_ai_gen.call_args.kwargs == {
+            "response_cache_size": 64,
+            "embedding_function": mock_vs.return_value.embedding_function,
+        }
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_step1_tool_manager_setup(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
-        """Step 1: Verify ToolManager registers tools correctly."""
-        from rag_system import RAGSystem
 
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-        rag = RAGSystem(config)
+class TestDiagnoseQueryFailure:
+    """Diagnostic tests to identify which component causes query failures."""
 
+    def test_diagnose_query_construction(self, rag):
+        """Walk the query path: tools registered, handed to AIGenerator, executable."""
+        # Step 1: ToolManager registers both tools
         defs = rag.tool_manager.get_tool_definitions()
         assert len(defs) == 2
 
@@ -225,109 +291,66 @@ class TestDiagnoseQueryFailure:
         assert "search_course_content" in tool_names
         assert "get_course_outline" in tool_names
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_step2_ai_generator_receives_tools(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
-        """Step 2: Verify AIGenerator receives tool definitions."""
-        from rag_system import RAGSystem
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-        mock_ai_gen.return_value.generate_response.return_value = "Test response"
-
-        rag = RAGSystem(config)
         rag.query("Test query")
+        # Snapshot the single generate_response call once for both checks
+        call_kwargs = rag.ai_generator.generate_response.call_args.kwargs
 
-        # Verify generate_response was called with tools
-        call_kwargs = mock_ai_gen.return_value.generate_response.call_args.kwargs
+        # Step 2: AIGenerator receives the tool definitions
         assert "tools" in call_kwargs
         assert len(call_kwargs["tools"]) == 2
 
-    @patch("rag_system.VectorStore")
-    @patch("rag_system.AIGenerator")
-    @patch("rag_system.DocumentProcessor")
-    @patch("rag_system.SessionManager")
-    def test_step3_tool_manager_passed_to_generator(
-        self, mock_session, mock_doc_proc, mock_ai_gen, mock_vs, temp_chroma_path
-    ):
-        """Step 3: Verify tool_manager is passed for tool execution."""
-        from rag_system import RAGSystem
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-        mock_ai_gen.return_value.generate_response.return_value = "Test response"
-
-        rag = RAGSystem(config)
-        rag.query("Test query")
-
-        call_kwargs = mock_ai_gen.return_value.generate_response.call_args.kwargs
+        # Step 3: tool_manager is passed through for tool execution
         assert "tool_manager" in call_kwargs
         assert call_kwargs["tool_manager"] is rag.tool_manager
 
+        # Step 4: the cache sees the bare question, not the prompt template
+        assert call_kwargs["cache_query"] == "Test query"
+
 
 class TestRAGSystemWithRealComponents:
     """Integration tests with minimal mocking to test component interaction."""
 
-    @patch("ai_generator.anthropic.Anthropic")
     def test_full_query_flow_with_real_tool_manager(
-        self, mock_anthropic_class, temp_chroma_path
+        self, patched_anthropic, patched_vector_store, temp_chroma_path
     ):
         """Test query flow with real ToolManager but mocked API."""
-        from rag_system import RAGSystem
-        from vector_store import SearchResults
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-
-        # Setup mock Anthropic client
-        mock_client = mock_anthropic_class.return_value
+        mock_client = patched_anthropic.return_value
         mock_client.messages.create.return_value = create_text_response("Test answer")
 
-        with patch("rag_system.VectorStore") as mock_vs_class:
-            # Setup VectorStore mock
-            mock_vs = mock_vs_class.return_value
-            mock_vs.search.return_value = SearchResults(
-                documents=["Content"],
-                metadata=[{"course_title": "Test", "lesson_number": 1}],
-                distances=[0.5],
-            )
-            mock_vs.get_lesson_link.return_value = None
+        mock_vs = patched_vector_store.return_value
+        mock_vs.search.return_value = SearchResults(
+            documents=["Content"],
+            metadata=[{"course_title": "Test", "lesson_number": 1}],
+            distances=[0.5],
+        )
 
-            rag = RAGSystem(config)
-            response, sources = rag.query("What is AI?")
+        rag = RAGSystem(make_config(CHROMA_PATH=temp_chroma_path))
+        response, sources = rag.query("What is AI?")
 
-            assert response == "Test answer"
+        assert response == "Test answer"
 
-    @patch("ai_generator.anthropic.Anthropic")
     def test_full_query_flow_with_tool_use(
-        self, mock_anthropic_class, temp_chroma_path
+        self, patched_anthropic, patched_vector_store, temp_chroma_path
     ):
         """Test query flow when Claude uses a tool."""
-        from rag_system import RAGSystem
-        from vector_store import SearchResults
-
-        config = MockConfig(CHROMA_PATH=temp_chroma_path)
-
-        # Setup mock - first returns tool_use, second returns final answer
-        mock_client = mock_anthropic_class.return_value
+        # First returns tool_use, second returns final answer
+        mock_client = patched_anthropic.return_value
         mock_client.messages.create.side_effect = [
             create_tool_use_response("search_course_content", {"query": "AI concepts"}),
             create_text_response("AI is about machine learning..."),
         ]
 
-        with patch("rag_system.VectorStore") as mock_vs_class:
-            mock_vs = mock_vs_class.return_value
-            mock_vs.search.return_value = SearchResults(
-                documents=["AI fundamentals content"],
-                metadata=[{"course_title": "AI Course", "lesson_number": 1}],
-                distances=[0.3],
-            )
-            mock_vs.get_lesson_link.return_value = "https://example.com/ai-course/1"
+        mock_vs = patched_vector_store.return_value
+        mock_vs.search.return_value = SearchResults(
+            documents=["AI fundamentals content"],
+            metadata=[{"course_title": "AI Course", "lesson_number": 1}],
+            distances=[0.3],
+        )
+        mock_vs.get_lesson_link.return_value = "https://example.com/ai-course/1"
 
-            rag = RAGSystem(config)
-            response, sources = rag.query("What is AI?")
+        rag = RAGSystem(make_config(CHROMA_PATH=temp_chroma_path))
+        response, sources = rag.query("What is AI?")
 
-            assert response == "AI is about machine learning..."
-            # Verify search was called (tool was executed)
-            mock_vs.search.assert_called_once()
+        assert response == "AI is about machine learning..."
+        # Verify search was called (tool was executed)
+        mock_vs.search.assert_called_once()
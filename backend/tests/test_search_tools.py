@@ -1,14 +1,11 @@
 """Tests for CourseSearchTool and ToolManager."""
 
-import sys
-from pathlib import Path
 from unittest.mock import MagicMock
 
 import pytest
 
-# Add backend to path
-backend_path = Path(__file__).parent.parent
-sys.path.insert(0, str(backend_path))
+# search_tools imports vector_store, which needs chromadb
+pytest.importorskip("chromadb")
 
 from search_tools import CourseOutlineTool, CourseSearchTool, ToolManager
 from vector_store import SearchResults
@@ -17,94 +14,81 @@ from vector_store import SearchResults
 class TestCourseSearchToolExecute:
     """Tests for CourseSearchTool.execute method."""
 
-    def test_execute_successful_search(self, mock_vector_store, sample_search_results):
-        """Test execute returns formatted results on successful search."""
-        mock_vector_store.search.return_value = sample_search_results
-
-        tool = CourseSearchTool(mock_vector_store)
-        result = tool.execute(query="machine learning")
-
-        assert "AI Course" in result
-        assert "Lesson 1" in result
-        mock_vector_store.search.assert_called_once_with(
-            query="machine learning", course_name=None, lesson_number=None
-        )
-
-    def test_execute_empty_results(self, mock_vector_store, empty_search_results):
-        """Test execute returns appropriate message for empty results."""
-        mock_vector_store.search.return_value = empty_search_results
-
-        tool = CourseSearchTool(mock_vector_store)
-        result = tool.execute(query="nonexistent topic")
-
-        assert "No relevant content found" in result
-
-    def test_execute_empty_results_with_course_filter(
-        self, mock_vector_store, empty_search_results
+    @pytest.mark.parametrize(
+        "kwargs, expected_call",
+        [
+            (
+                {"query": "machine learning"},
+                {
+                    "query": "machine learning",
+                    "course_name": None,
+                    "lesson_number": None,
+                },
+            ),
+            (
+                {"query": "test", "course_name": "AI Course"},
+                {"query": "test", "course_name": "AI Course", "lesson_number": None},
+            ),
+            (
+                {"query": "test", "lesson_number": 3},
+                {"query": "test", "course_name": None, "lesson_number": 3},
+            ),
+            (
+                {"query": "test", "course_name": "AI Course", "lesson_number": 2},
+                {"query": "test", "course_name": "AI Course", "lesson_number": 2},
+            ),
+        ],
+        ids=["no_filter", "course_filter", "lesson_filter", "both_filters"],
+    )
+    def test_execute_passes_filters(
+        self, stub_vector_store, sample_search_results, kwargs, expected_call
     ):
-        """Test execute message includes course filter info for empty results."""
-        mock_vector_store.search.return_value = empty_search_results
+        """Test execute forwards filters to VectorStore and formats the results."""
+        stub_vector_store.search_result = sample_search_results
 
-        tool = CourseSearchTool(mock_vector_store)
-        result = tool.execute(query="test", course_name="AI Course")
+        tool = CourseSearchTool(stub_vector_store)
+        result = tool.execute(**kwargs)
 
-        assert "No relevant content found" in result
         assert "AI Course" in result
-
-    def test_execute_empty_results_with_lesson_filter(
-        self, mock_vector_store, empty_search_results
+        assert "Lesson 1" in result
+        assert stub_vector_store.calls == [expected_call]
+
+    @pytest.mark.parametrize(
+        "kwargs, expected_substrings",
+        [
+            ({"query": "nonexistent topic"}, ["No relevant content found"]),
+            (
+                {"query": "test", "course_name": "AI Course"},
+                ["No relevant content found", "AI Course"],
+            ),
+            (
+                {"query": "test", "lesson_number": 5},
+                ["No relevant content found", "lesson 5"],
+            ),
+        ],
+        ids=["no_filter", "course_filter", "lesson_filter"],
+    )
+    def test_execute_empty_results(
+        self, stub_vector_store, empty_search_results, kwargs, expected_substrings
     ):
-        """Test execute message includes lesson filter info for empty results."""
-        mock_vector_store.search.return_value = empty_search_results
+        """Test empty-results message, including any filters that were applied."""
+        stub_vector_store.search_result = empty_search_results
 
-        tool = CourseSearchTool(mock_vector_store)
-        result = tool.execute(query="test", lesson_number=5)
+        tool = CourseSearchTool(stub_vector_store)
+        result = tool.execute(**kwargs)
 
-        assert "No relevant content found" in result
-        assert "lesson 5" in result
+        for substring in expected_substrings:
+            assert substring in result
 
-    def test_execute_with_error(self, mock_vector_store, error_search_results):
+    def test_execute_with_error(self, stub_vector_store, error_search_results):
         """Test execute returns error message from VectorStore."""
-        mock_vector_store.search.return_value = error_search_results
+        stub_vector_store.search_result = error_search_results
 
-        tool = CourseSearchTool(mock_vector_store)
+        tool = CourseSearchTool(stub_vector_store)
         result = tool.execute(query="test query")
 
         assert result == "Search error: connection failed"
 
-    def test_execute_with_course_filter(self, mock_vector_store, sample_search_results):
-        """Test execute passes course_name filter to VectorStore."""
-        mock_vector_store.search.return_value = sample_search_results
-
-        tool = CourseSearchTool(mock_vector_store)
-        tool.execute(query="test", course_name="AI Course")
-
-        mock_vector_store.search.assert_called_once_with(
-            query="test", course_name="AI Course", lesson_number=None
-        )
-
-    def test_execute_with_lesson_filter(self, mock_vector_store, sample_search_results):
-        """Test execute passes lesson_number filter to VectorStore."""
-        mock_vector_store.search.return_value = sample_search_results
-
-        tool = CourseSearchTool(mock_vector_store)
-        tool.execute(query="test", lesson_number=3)
-
-        mock_vector_store.search.assert_called_once_with(
-            query="test", course_name=None, lesson_number=3
-        )
-
-    def test_execute_with_both_filters(self, mock_vector_store, sample_search_results):
-        """Test execute passes both filters to VectorStore."""
-        mock_vector_store.search.return_value = sample_search_results
-
-        tool = CourseSearchTool(mock_vector_store)
-        tool.execute(query="test", course_name="AI Course", lesson_number=2)
-
-        mock_vector_store.search.assert_called_once_with(
-            query="test", course_name="AI Course", lesson_number=2
-        )
-
 
 class TestCourseSearchToolFormatResults:
     """Tests for CourseSearchTool._format_results and source tracking."""
@@ -163,6 +147,65 @@ class TestCourseSearchToolDefinition:
         assert definition["input_schema"]["required"] == ["query"]
 
 
+class TestCourseOutlineToolCache:
+    """Tests for CourseOutlineTool outline caching."""
+
+    @pytest.fixture
+    def outline_store(self, mock_vector_store):
+        mock_vector_store.get_course_metadata.return_value = {
+            "title": "AI Course",
+            "course_link": "https://example.com/ai",
+            "lessons": [{"lesson_number": 1, "lesson_title": "Intro"}],
+        }
+        return mock_vector_store
+
+    def test_repeat_outline_served_from_cache(self, outline_store):
+        """Test repeat lookups skip the store and still restore sources."""
+        tool = CourseOutlineTool(outline_store)
+
+        first = tool.execute(course_title="AI")
+        tool.last_sources = []
+        second = tool.execute(course_title="AI")
+
+        assert first == second
+        assert "Lesson 1: Intro" in second
+        assert tool.last_sources == [
+            {"text": "AI Course", "url": "https://example.com/ai"}
+        ]
+        outline_store._resolve_course_name.assert_called_once()
+        outline_store.get_course_metadata.assert_called_once()
+
+    def test_expired_outline_refetched(self, outline_store, monkeypatch):
+        """Test outlines are looked up again once the TTL has passed."""
+        now = [1000.0]
+        monkeypatch.setattr("search_tools.time.monotonic", lambda: now[0])
+        tool = CourseOutlineTool(outline_store)
+
+        tool.execute(course_title="AI")
+        now[0] += CourseOutlineTool.OUTLINE_CACHE_TTL + 1
+        tool.execute(course_title="AI")
+
+        assert outline_store.get_course_metadata.call_count == 2
+
+    def test_missing_course_not_cached(self, outline_store):
+        """Test failed lookups are retried rather than cached."""
+        outline_store._resolve_course_name.return_value = None
+        tool = CourseOutlineTool(outline_store)
+
+        tool.execute(course_title="Unknown")
+        tool.execute(course_title="Unknown")
+
+        assert outline_store._resolve_course_name.call_count == 2
+
+
+@pytest.fixture
+def populated_tool_manager(mock_vector_store):
+    """ToolManager with a CourseSearchTool over mock_vector_store registered."""
+    manager = ToolManager()
+    manager.register_tool(CourseSearchTool(mock_vector_store))
+    return manager
+
+
 class TestToolManager:
     """Tests for ToolManager class."""
 
@@ -188,23 +231,18 @@ class TestToolManager:
         assert "search_course_content" in manager.tools
         assert "get_course_outline" in manager.tools
 
-    def test_get_tool_definitions(self, mock_vector_store):
+    def test_get_tool_definitions(self, populated_tool_manager):
         """Test ToolManager returns all tool definitions."""
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+        manager = populated_tool_manager
 
         definitions = manager.get_tool_definitions()
 
         assert len(definitions) == 1
         assert definitions[0]["name"] == "search_course_content"
 
-    def test_execute_tool_success(self, mock_vector_store, sample_search_results):
+    def test_execute_tool_success(self, populated_tool_manager):
         """Test ToolManager executes registered tool."""
-        mock_vector_store.search.return_value = sample_search_results
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+        manager = populated_tool_manager
 
         result = manager.execute_tool("search_course_content", query="test")
 
@@ -218,12 +256,9 @@ class TestToolManager:
 
         assert "not found" in result.lower()
 
-    def test_get_last_sources(self, mock_vector_store, sample_search_results):
+    def test_get_last_sources(self, populated_tool_manager):
         """Test ToolManager retrieves sources from tools."""
-        mock_vector_store.search.return_value = sample_search_results
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+        manager = populated_tool_manager
 
         # Execute to populate sources
         manager.execute_tool("search_course_content", query="test")
@@ -231,12 +266,9 @@ class TestToolManager:
 
         assert len(sources) == 1
 
-    def test_reset_sources(self, mock_vector_store, sample_search_results):
+    def test_reset_sources(self, populated_tool_manager):
         """Test ToolManager clears sources from all tools."""
-        mock_vector_store.search.return_value = sample_search_results
-        manager = ToolManager()
-        tool = CourseSearchTool(mock_vector_store)
-        manager.register_tool(tool)
+        manager = populated_tool_manager
 
         # Execute then reset
         manager.execute_tool("search_course_content", query="test")
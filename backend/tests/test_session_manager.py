@@ -0,0 +1,54 @@
+"""Tests for SessionManager class."""
+
+from session_manager import SessionManager
+
+
+class TestSessionManagerHistory:
+    """Tests for SessionManager.get_conversation_history."""
+
+    def test_history_is_api_ready_role_content_messages(self):
+        """Test exchanges come back as ordered {"role", "content"} dicts."""
+        manager = SessionManager()
+        session_id = manager.create_session()
+
+        manager.add_exchange(session_id, "What is ML?", "Machine learning.")
+        manager.add_exchange(session_id, "And DL?", "")
+
+        assert manager.get_conversation_history(session_id) == [
+            {"role": "user", "content": "What is ML?"},
+            {"role": "assistant", "content": "Machine learning."},
+            {"role": "user", "content": "And DL?"},
+            {"role": "assistant", "content": ""},
+        ]
+
+    def test_history_missing_or_empty_session(self):
+        """Test None is returned for no session, unknown ids and empty sessions."""
+        manager = SessionManager()
+        session_id = manager.create_session()
+
+        assert manager.get_conversation_history(None) is None
+        assert manager.get_conversation_history("session_unknown") is None
+        assert manager.get_conversation_history(session_id) is None
+
+    def test_history_keeps_last_max_history_exchanges(self):
+        """Test only the most recent max_history exchanges are kept."""
+        manager = SessionManager(max_history=1)
+        session_id = manager.create_session()
+
+        manager.add_exchange(session_id, "Old question", "Old answer")
+        manager.add_exchange(session_id, "New question", "New answer")
+
+        assert manager.get_conversation_history(session_id) == [
+            {"role": "user", "content": "New question"},
+            {"role": "assistant", "content": "New answer"},
+        ]
+
+    def test_history_returns_fresh_list(self):
+        """Test callers can modify the returned history without side effects."""
+        manager = SessionManager()
+        session_id = manager.create_session()
+        manager.add_exchange(session_id, "Hi", "Hello!")
+
+        manager.get_conversation_history(session_id).clear()
+
+        assert len(manager.get_conversation_history(session_id)) == 2
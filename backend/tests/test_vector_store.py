@@ -1,315 +1,266 @@
 """Tests for VectorStore class."""
 
-import sys
-from pathlib import Path
-from unittest.mock import MagicMock, patch
+import dataclasses
+from unittest.mock import patch
 
 import pytest
+from helpers import StubClient, StubCollection
 
-# Add backend to path
-backend_path = Path(__file__).parent.parent
-sys.path.insert(0, str(backend_path))
+# Keep these tests on one xdist worker so the module-scoped mocked store is built once
+pytestmark = pytest.mark.xdist_group("vector_store")
 
-from vector_store import SearchResults, VectorStore
+# Canned ChromaDB query results; shared by tests, so treat them as read-only
+_CHROMA_RESULT_ML = {
+    "documents": [["Machine learning is..."]],
+    "metadatas": [[{"course_title": "AI Course", "lesson_number": 1}]],
+    "distances": [[0.3]],
+}
+_CHROMA_RESOLVE_AI = {
+    "documents": [["AI Fundamentals Course"]],
+    "metadatas": [[{"title": "AI Fundamentals Course", "instructor": "John"}]],
+}
+_CHROMA_EMPTY_INNER = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+_CHROMA_EMPTY_OUTER = {"documents": [], "metadatas": [], "distances": []}
 
 
 class TestSearchResults:
     """Tests for SearchResults dataclass."""
 
-    def test_from_chroma_with_results(self):
-        """Test creating SearchResults from valid ChromaDB results."""
-        chroma_results = {
-            "documents": [["Doc 1", "Doc 2"]],
-            "metadatas": [[{"course_title": "Course A"}, {"course_title": "Course B"}]],
-            "distances": [[0.1, 0.2]],
-        }
-        results = SearchResults.from_chroma(chroma_results)
-
-        assert results.documents == ["Doc 1", "Doc 2"]
-        assert len(results.metadata) == 2
-        assert results.distances == [0.1, 0.2]
+    @pytest.mark.parametrize(
+        "chroma_results, expected_docs, expected_distances, expected_empty",
+        [
+            (
+                {
+                    "documents": [["Doc 1", "Doc 2"]],
+                    "metadatas": [
+                        [{"course_title": "Course A"}, {"course_title": "Course B"}]
+                    ],
+                    "distances": [[0.1, 0.2]],
+                },
+                ["Doc 1", "Doc 2"],
+                [0.1, 0.2],
+                False,
+            ),
+            (_CHROMA_EMPTY_INNER, [], [], True),
+            (_CHROMA_EMPTY_OUTER, [], [], True),
+        ],
+        ids=["with_results", "empty_results", "empty_outer_lists"],
+    )
+    def test_from_chroma(
+        self,
+        search_results_cls,
+        chroma_results,
+        expected_docs,
+        expected_distances,
+        expected_empty,
+    ):
+        """Test creating SearchResults from ChromaDB query results."""
+        results = search_results_cls.from_chroma(chroma_results)
+
+        assert results.documents == expected_docs
+        assert len(results.metadata) == len(expected_docs)
+        assert results.distances == expected_distances
+        assert results.is_empty() == expected_empty
         assert results.error is None
 
-    def test_from_chroma_empty_results(self):
-        """Test creating SearchResults from empty ChromaDB results."""
-        chroma_results = {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-        results = SearchResults.from_chroma(chroma_results)
+    def test_empty_with_error(self, search_results_cls):
+        """Test creating empty SearchResults with error message."""
+        results = search_results_cls.empty("Test error")
 
-        assert results.documents == []
-        assert results.metadata == []
         assert results.is_empty()
+        assert results.error == "Test error"
 
-    def test_from_chroma_none_fields(self):
-        """Test creating SearchResults when ChromaDB returns empty outer lists."""
-        chroma_results = {"documents": [], "metadatas": [], "distances": []}
-        results = SearchResults.from_chroma(chroma_results)
+    def test_is_frozen(self, search_results_cls):
+        """Test SearchResults cannot be mutated, so fixtures can share instances."""
+        results = search_results_cls.empty("Test error")
 
-        assert results.documents == []
-        assert results.is_empty()
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            results.error = None
 
-    def test_empty_with_error(self):
-        """Test creating empty SearchResults with error message."""
-        results = SearchResults.empty("Test error")
 
-        assert results.is_empty()
-        assert results.error == "Test error"
+@pytest.fixture(scope="module")
+def _patched_chroma():
+    """Patch the ChromaDB client and embedding function once per module."""
+    pytest.importorskip("chromadb")
+    with (
+        patch("vector_store.chromadb.PersistentClient") as mock_client,
+        patch(
+            "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
+        ) as mock_embedding,
+    ):
+        yield mock_client, mock_embedding
+
+
+@pytest.fixture(scope="module")
+def _mocked_store(_patched_chroma, temp_chroma_path):
+    """One VectorStore per module on the patched ChromaDB client and embeddings."""
+    mock_client, _ = _patched_chroma
+    catalog = StubCollection()
+    content = StubCollection()
+    mock_client.return_value = StubClient(
+        {"course_catalog": catalog, "course_content": content}
+    )
+    from vector_store import VectorStore
+
+    store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
+    return store, catalog, content
+
+
+@pytest.fixture
+def patched_chroma(_patched_chroma, _mocked_store):
+    """(mock_client, mock_embedding) as used to build the module's VectorStore."""
+    return _patched_chroma
+
+
+@pytest.fixture
+def vector_store_mocked(_mocked_store):
+    """(store, catalog, content); collection stubs reset after each test."""
+    yield _mocked_store
+    _, catalog, content = _mocked_store
+    for collection in (catalog, content):
+        collection.reset()
+
+
+class TestVectorStoreInit:
+    """Tests for VectorStore construction."""
+
+    def test_init_wires_client_embeddings_and_collections(
+        self, patched_chroma, vector_store_mocked, temp_chroma_path
+    ):
+        """Test the client, embedding function and both collections are set up."""
+        mock_client, mock_embedding = patched_chroma
+        store, catalog, content = vector_store_mocked
+
+        assert mock_client.call_args.kwargs["path"] == temp_chroma_path
+        mock_embedding.assert_called_once_with(model_name="all-MiniLM-L6-v2")
+        assert store.course_catalog is catalog
+        assert store.course_content is content
+        assert store.max_results == 5
 
 
 class TestVectorStoreResolveCourseName:
     """Tests for VectorStore._resolve_course_name method."""
 
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_resolve_course_name_success(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
+    def test_resolve_course_name_success(self, vector_store_mocked):
         """Test successful course name resolution."""
-        # Setup mock collection
-        mock_collection = MagicMock()
-        mock_collection.query.return_value = {
-            "documents": [["AI Fundamentals Course"]],
-            "metadatas": [[{"title": "AI Fundamentals Course", "instructor": "John"}]],
-        }
-        mock_client.return_value.get_or_create_collection.return_value = mock_collection
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
+        store, catalog, _ = vector_store_mocked
+        catalog.query_return = _CHROMA_RESOLVE_AI
+
         result = store._resolve_course_name("AI course")
 
         assert result == "AI Fundamentals Course"
-        mock_collection.query.assert_called_once()
-
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_resolve_course_name_empty_catalog(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
-        """
-        BUG TEST: Empty catalog should return None, not raise IndexError.
-        Tests lines 110-112 in vector_store.py.
-        """
-        # Setup mock to return empty results
-        mock_collection = MagicMock()
-        mock_collection.query.return_value = {"documents": [[]], "metadatas": [[]]}
-        mock_client.return_value.get_or_create_collection.return_value = mock_collection
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-        result = store._resolve_course_name("nonexistent")
-
-        # Should return None gracefully, not raise error
-        assert result is None
-
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_resolve_course_name_completely_empty_results(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
-        """
-        BUG TEST: Completely empty results (empty outer lists) should not raise IndexError.
-        """
-        mock_collection = MagicMock()
-        mock_collection.query.return_value = {"documents": [], "metadatas": []}
-        mock_client.return_value.get_or_create_collection.return_value = mock_collection
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-
-        # This should not raise an IndexError
-        try:
-            result = store._resolve_course_name("test")
-            # If no exception, result should be None
-            assert result is None
-        except IndexError as e:
-            pytest.fail(f"IndexError raised when accessing empty results: {e}")
-
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_resolve_course_name_exception_handling(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
-        """
-        Test that exceptions in _resolve_course_name are caught and return None.
-        Tests lines 113-114 in vector_store.py.
-        """
-        mock_collection = MagicMock()
-        mock_collection.query.side_effect = Exception("Database connection failed")
-        mock_client.return_value.get_or_create_collection.return_value = mock_collection
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-        result = store._resolve_course_name("test")
-
-        # Should return None, not raise exception
-        assert result is None
+        assert len(catalog.query_calls) == 1
 
 
 class TestVectorStoreSearch:
     """Tests for VectorStore.search method."""
 
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_search_returns_results(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
+    def test_search_returns_results(self, vector_store_mocked):
         """Test basic search returns results."""
-        mock_collection = MagicMock()
-        mock_collection.query.return_value = {
-            "documents": [["Machine learning is..."]],
-            "metadatas": [[{"course_title": "AI Course", "lesson_number": 1}]],
-            "distances": [[0.3]],
-        }
-        mock_client.return_value.get_or_create_collection.return_value = mock_collection
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
+        store, _, content = vector_store_mocked
+        content.query_return = _CHROMA_RESULT_ML
+
         results = store.search("what is machine learning")
 
         assert not results.is_empty()
         assert "Machine learning" in results.documents[0]
         assert results.error is None
 
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_search_empty_collection(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
+    def test_search_empty_collection(self, vector_store_mocked):
         """Test search on empty collection returns empty results."""
-        mock_collection = MagicMock()
-        mock_collection.query.return_value = {
-            "documents": [[]],
-            "metadatas": [[]],
-            "distances": [[]],
-        }
-        mock_client.return_value.get_or_create_collection.return_value = mock_collection
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
+        store, _, content = vector_store_mocked
+        content.query_return = _CHROMA_EMPTY_INNER
+
         results = store.search("anything")
 
         assert results.is_empty()
         assert results.error is None  # Empty is not an error
 
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_search_with_course_filter_not_found(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
+    def test_search_with_course_filter_not_found(self, vector_store_mocked):
         """Test search with course filter that doesn't match returns error."""
-        mock_catalog = MagicMock()
-        mock_catalog.query.return_value = {"documents": [[]], "metadatas": [[]]}
+        store, catalog, content = vector_store_mocked
+        catalog.query_return = _CHROMA_EMPTY_INNER
+        content.query_return = _CHROMA_EMPTY_INNER
 
-        mock_content = MagicMock()
-        mock_content.query.return_value = {
-            "documents": [[]],
-            "metadatas": [[]],
-            "distances": [[]],
-        }
-
-        def get_collection(name, **kwargs):
-            if name == "course_catalog":
-                return mock_catalog
-            return mock_content
-
-        mock_client.return_value.get_or_create_collection.side_effect = get_collection
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
         results = store.search("test", course_name="Nonexistent Course")
 
         assert results.is_empty()
         assert results.error is not None
         assert "No course found" in results.error
 
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
+
+class TestVectorStoreErrorPaths:
+    """Empty or failing ChromaDB queries degrade to None / error SearchResults."""
+
+    @pytest.mark.parametrize(
+        "collection, query_kwargs, call, predicate",
+        [
+            # BUG TEST: empty catalog should return None, not raise IndexError
+            (
+                "catalog",
+                {"query_return": _CHROMA_EMPTY_INNER},
+                lambda store: store._resolve_course_name("nonexistent"),
+                lambda result: result is None,
+            ),
+            # BUG TEST: empty outer lists should not raise IndexError either
+            (
+                "catalog",
+                {"query_return": _CHROMA_EMPTY_OUTER},
+                lambda store: store._resolve_course_name("test"),
+                lambda result: result is None,
+            ),
+            (
+                "catalog",
+                {"query_side_effect": Exception("Database connection failed")},
+                lambda store: store._resolve_course_name("test"),
+                lambda result: result is None,
+            ),
+            (
+                "content",
+                {"query_side_effect": Exception("ChromaDB connection error")},
+                lambda store: store.search("test query"),
+                lambda results: results.is_empty()
+                and "Search error" in (results.error or ""),
+            ),
+        ],
+        ids=[
+            "resolve_empty_catalog",
+            "resolve_empty_outer_lists",
+            "resolve_exception",
+            "search_exception",
+        ],
     )
-    def test_search_chroma_exception(
-        self, mock_embedding, mock_client, temp_chroma_path
+    def test_error_paths(
+        self, vector_store_mocked, collection, query_kwargs, call, predicate
     ):
-        """
-        Test that ChromaDB exceptions are caught and return error SearchResults.
-        Tests lines 99-100 in vector_store.py.
-        """
-        mock_collection = MagicMock()
-        mock_collection.query.side_effect = Exception("ChromaDB connection error")
-        mock_client.return_value.get_or_create_collection.return_value = mock_collection
+        """Test the query failure is caught and reported, never raised."""
+        store, catalog, content = vector_store_mocked
+        stubs = {"catalog": catalog, "content": content}
+        for name, value in query_kwargs.items():
+            setattr(stubs[collection], name, value)
 
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-        results = store.search("test query")
-
-        assert results.is_empty()
-        assert results.error is not None
-        assert "Search error" in results.error
+        assert predicate(call(store))
 
 
 class TestVectorStoreBuildFilter:
     """Tests for VectorStore._build_filter method."""
 
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
+    @pytest.mark.parametrize(
+        "course, lesson, expected",
+        [
+            (None, None, None),
+            ("AI Course", None, {"course_title": "AI Course"}),
+            (None, 1, {"lesson_number": 1}),
+            (
+                "AI Course",
+                2,
+                {"$and": [{"course_title": "AI Course"}, {"lesson_number": 2}]},
+            ),
+        ],
+        ids=["no_params", "course_only", "lesson_only", "both_params"],
     )
-    def test_build_filter_no_params(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
-        """Test filter with no parameters returns None."""
-        mock_client.return_value.get_or_create_collection.return_value = MagicMock()
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-        result = store._build_filter(None, None)
-
-        assert result is None
-
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_build_filter_course_only(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
-        """Test filter with only course_title."""
-        mock_client.return_value.get_or_create_collection.return_value = MagicMock()
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-        result = store._build_filter("AI Course", None)
-
-        assert result == {"course_title": "AI Course"}
-
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_build_filter_lesson_only(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
-        """Test filter with only lesson_number."""
-        mock_client.return_value.get_or_create_collection.return_value = MagicMock()
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-        result = store._build_filter(None, 1)
-
-        assert result == {"lesson_number": 1}
-
-    @patch("vector_store.chromadb.PersistentClient")
-    @patch(
-        "vector_store.chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction"
-    )
-    def test_build_filter_both_params(
-        self, mock_embedding, mock_client, temp_chroma_path
-    ):
-        """Test filter with both course_title and lesson_number."""
-        mock_client.return_value.get_or_create_collection.return_value = MagicMock()
-
-        store = VectorStore(temp_chroma_path, "all-MiniLM-L6-v2", 5)
-        result = store._build_filter("AI Course", 2)
+    def test_build_filter(self, vector_store_mocked, course, lesson, expected):
+        """Test filter built from course_title and/or lesson_number."""
+        store, _, _ = vector_store_mocked
 
-        assert result == {"$and": [{"course_title": "AI Course"}, {"lesson_number": 2}]}
+        assert store._build_filter(course, lesson) == expected
@@ -6,7 +6,7 @@ from chromadb.config import Settings
 from models import Course, CourseChunk
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SearchResults:
     """Container for search results with metadata"""
 